@@ -0,0 +1,102 @@
+"""
+Capture decode cost against the source resolution: OpenCV decoding at the
+file's resolution and resizing, against ffmpeg scaling inside the decoder, each
+keeping every frame or only every Nth. Test files are generated locally with
+ffmpeg (H.264, testsrc2 pattern, a keyframe every 2 s like most cameras), so
+no footage is needed.
+
+CPU time includes the ffmpeg child processes, so on a shared host it is the
+number to compare; wall time depends on how many cores the decoders can use.
+
+    python -m benchmarks.decode
+    python -m benchmarks.decode --resolutions 1920x1080 3840x2160 --every 1 5 --seconds 10
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from capture import FfmpegReader, OpenCvReader
+
+
+def generate(ffmpeg, path, resolution, seconds, fps):
+    subprocess.run([ffmpeg, '-nostdin', '-loglevel', 'error', '-y', '-f', 'lavfi',
+                    '-i', f'testsrc2=size={resolution}:rate={fps}', '-t', str(seconds),
+                    '-c:v', 'libx264', '-preset', 'ultrafast', '-g', str(2 * fps), '-pix_fmt', 'yuv420p', path],
+                   check=True)
+
+
+def cpu_seconds():
+    usage = (resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN))
+    return sum(u.ru_utime + u.ru_stime for u in usage)
+
+
+def measure(reader, frame_size):
+    frame = np.empty((frame_size[1], frame_size[0], 3), dtype=np.uint8)
+    frames = 0
+    started, cpu_started = time.perf_counter(), cpu_seconds()
+    if reader.isOpened():
+        while reader.read(frame):
+            frames += 1
+    reader.release()  # waits for ffmpeg, so its CPU time is counted
+    wall, cpu = time.perf_counter() - started, cpu_seconds() - cpu_started
+    return {
+        'frames': frames,
+        'wallSeconds': wall,
+        'cpuSeconds': cpu,
+        'cpuMsPerFrame': cpu * 1000.0 / frames if frames else None,
+        'fps': frames / wall if wall else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode cost of the capture readers by source resolution')
+    parser.add_argument('--resolutions', nargs='+', default=['1280x720', '1920x1080', '3840x2160'])
+    parser.add_argument('--every', nargs='+', type=int, default=[1, 5], help='Decode every Nth frame')
+    parser.add_argument('--seconds', type=int, default=8, help='Length of the generated files')
+    parser.add_argument('--fps', type=int, default=25)
+    parser.add_argument('--width', type=int, default=640, help='Frame size the service works at')
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--ffmpeg', default='ffmpeg', help='ffmpeg executable')
+    parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+    args = parser.parse_args()
+
+    if shutil.which(args.ffmpeg) is None:
+        parser.error(f"{args.ffmpeg} not found; it is needed to generate the test files")
+    frame_size = (args.width, args.height)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for resolution in args.resolutions:
+            path = os.path.join(directory, f'{resolution}.mp4')
+            generate(args.ffmpeg, path, resolution, args.seconds, args.fps)
+            for every in args.every:
+                for decoder, reader in (('opencv', lambda: OpenCvReader(path, frame_size, every)),
+                                        ('ffmpeg', lambda: FfmpegReader(path, frame_size, every, args.ffmpeg))):
+                    results.append(dict(resolution=resolution, decoder=decoder, every=every,
+                                        **measure(reader(), frame_size)))
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'frameSize': f'{args.width}x{args.height}',
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as out_file:
+            out_file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
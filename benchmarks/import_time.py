@@ -0,0 +1,71 @@
+"""
+Startup cost of the service modules: wall time and peak RSS of a fresh
+interpreter importing each module, and which heavy optional dependencies the
+import pulled in. Every sample runs in its own process so nothing is cached
+between runs; the bare interpreter is measured as a baseline.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --modules sort pipeline --repeat 10
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+import numpy as np
+
+# Dependencies that the counting path should not need at import time
+HEAVY_MODULES = ('matplotlib', 'skimage', 'filterpy', 'scipy', 'torch', 'ultralytics')
+
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+if {module!r}:
+    __import__({module!r})
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    'seconds': elapsed,
+    'maxRssKb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'loaded': [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure(module, repeat):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                cwd=root, capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output))
+    seconds = np.array([sample['seconds'] for sample in samples]) * 1000.0
+    return {
+        'module': module or '(interpreter)',
+        'repeat': repeat,
+        'p50Ms': float(np.percentile(seconds, 50)),
+        'minMs': float(seconds.min()),
+        'maxRssKb': int(np.median([sample['maxRssKb'] for sample in samples])),
+        'heavyModulesLoaded': samples[0]['loaded'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time of the service modules')
+    parser.add_argument('--modules', nargs='+', default=['sort', 'pipeline', 'counting', 'capture'],
+                        help='Modules to import')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per module')
+    args = parser.parse_args()
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'results': [measure(module, args.repeat) for module in [''] + args.modules],
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
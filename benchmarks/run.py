@@ -0,0 +1,264 @@
+"""
+End-to-end benchmark suite for the counting service.
+
+Measures, on synthetic scenes and without model weights or a GPU:
+  sort_update     Sort.update latency against the number of people in frame
+  association     associate_detections_to_trackers cost against detections/tracks
+  pipeline        CountingPipeline.process latency with a stub detector, and how many
+                  frames after the true crossing a person is counted
+  jpeg_encode     MjpegBroadcaster encode cost per preview frame and JPEG quality
+  frame_ring      per-frame allocations and cost of decoding into new arrays and resizing,
+                  against reusing the decode buffer and resizing into a FrameRing slot
+  db_write        write-behind throughput into a local SQLite database by batch size
+
+Results are emitted as JSON so runs can be compared for regressions:
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --quick --only sort_update association
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from benchmarks.synthetic import SyntheticScene
+
+
+def summarize(samples):
+    samples = np.asarray(samples) * 1000.0
+    return {
+        'meanMs': float(samples.mean()),
+        'p50Ms': float(np.percentile(samples, 50)),
+        'p95Ms': float(np.percentile(samples, 95)),
+    }
+
+
+def bench_sort_update(args):
+    from sort import Sort
+    results = []
+    for people in args.crowds:
+        scene = SyntheticScene(people=people, seed=people)
+        tracker = Sort(max_age=3, min_hits=3)
+        samples = []
+        tracks = 0
+        for _ in range(args.frames):
+            scene.step()
+            dets = scene.detections()[:, :5]
+            started = time.perf_counter()
+            tracker.update(dets)
+            samples.append(time.perf_counter() - started)
+            tracks += len(tracker.active_ids())
+        results.append(dict(people=people, meanTracks=tracks / args.frames, **summarize(samples)))
+    return results
+
+
+def bench_association(args):
+    from sort import associate_detections_to_trackers
+    results = []
+    for people in args.crowds:
+        scene = SyntheticScene(people=people, seed=people)
+        samples = []
+        for _ in range(args.frames):
+            previous = scene.boxes()
+            scene.step()
+            dets = scene.detections()[:, :5]
+            started = time.perf_counter()
+            associate_detections_to_trackers(dets, previous, 0.3)
+            samples.append(time.perf_counter() - started)
+        results.append(dict(detections=people, tracks=people, **summarize(samples)))
+    return results
+
+
+def bench_pipeline(args):
+    from counting import LineCrossingCounter
+    from pipeline import CountingPipeline
+    from sort import Sort
+
+    results = []
+    for people in args.crowds:
+        scene = SyntheticScene(people=people, seed=people)
+        frame = np.zeros((scene.height, scene.width, 3), dtype=np.uint8)
+        pending = {}
+
+        def detect(_frame):
+            return pending['detections']
+
+        counter = LineCrossingCounter.parse('', (scene.width, scene.height))
+        pipeline = CountingPipeline(detect, Sort(max_age=3, min_hits=3), counter)
+        samples = []
+        counted_frames = []
+        for index in range(args.frames):
+            scene.step()
+            pending['detections'] = scene.detections()
+            started = time.perf_counter()
+            _, crossings = pipeline.process(frame)
+            samples.append(time.perf_counter() - started)
+            counted_frames.extend([index] * len(crossings))
+
+        # Match counted crossings to true ones in order to estimate the counting lag in frames
+        truth = scene.crossings
+        matched = min(len(truth), len(counted_frames))
+        lag = np.array(counted_frames[:matched]) - np.array(truth[:matched]) if matched else np.zeros(0)
+        results.append(dict(
+            people=people,
+            trueCrossings=len(truth),
+            countedCrossings=len(counted_frames),
+            meanLagFrames=float(lag.mean()) if len(lag) else None,
+            **summarize(samples)))
+    return results
+
+
+def bench_jpeg_encode(args):
+    from broadcast import MjpegBroadcaster
+    scene = SyntheticScene(people=20)
+    frames = []
+    for _ in range(min(args.frames, 50)):
+        scene.step()
+        frames.append(scene.render())
+
+    results = []
+    for quality in (50, 80, 95):
+        broadcaster = MjpegBroadcaster(preview_fps=0, jpeg_quality=quality)
+        broadcaster.subscribers = 1  # encode as if a viewer were attached
+        samples = []
+        for frame in frames:
+            started = time.perf_counter()
+            broadcaster.publish(frame)
+            samples.append(time.perf_counter() - started)
+        results.append(dict(quality=quality, bytes=len(broadcaster.chunk), **summarize(samples)))
+    return results
+
+
+def bench_frame_ring(args):
+    import cv2
+    from framering import FrameRing
+
+    scene = SyntheticScene(people=20, width=1920, height=1080)
+    scene.step()
+    decoded = scene.render()
+    size = (640, 480)
+    ring = FrameRing(4, (size[1], size[0], 3))
+    buffer = np.empty_like(decoded)
+
+    # The copy out of `decoded` stands in for the decoder writing a frame
+    def allocate():
+        frame = decoded.copy()  # cap.read() into a new array
+        cv2.resize(frame, size)
+
+    def into_slot():
+        np.copyto(buffer, decoded)  # cap.read(buffer) reusing the decode buffer
+        slot = ring.acquire()
+        cv2.resize(buffer, size, dst=ring.frame(slot))
+        ring.release(slot)
+
+    results = []
+    try:
+        for name, step in (('allocate', allocate), ('ring', into_slot)):
+            step()
+            tracemalloc.start()
+            samples = []
+            for _ in range(args.frames):
+                started = time.perf_counter()
+                step()
+                samples.append(time.perf_counter() - started)
+            _, peak = tracemalloc.get_traced_memory()
+            allocated = sum(stat.size for stat in tracemalloc.take_snapshot().statistics('filename'))
+            tracemalloc.stop()
+            results.append(dict(path=name, frames=args.frames, peakBytes=peak, retainedBytes=allocated,
+                                **summarize(samples)))
+    finally:
+        ring.close()
+    return results
+
+
+def bench_db_write(args):
+    from flask import Flask
+    from models import db, insert_visitor_counts
+    from persistence import WriteBehindWriter
+
+    tmpdir = tempfile.mkdtemp()
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tmpdir, 'db_write_bench.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    def flush(entries):
+        with app.app_context():
+            insert_visitor_counts(entries)
+            db.session.commit()
+
+    results = []
+    events = args.db_events
+    start = datetime(2026, 1, 1, 8, 0, 0)
+    for max_batch in (1, 10, 100, 500):
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+        writer = WriteBehindWriter(flush, max_batch=max_batch, flush_interval=0.05, max_queue=events + 1)
+        writer.start()
+        started = time.perf_counter()
+        for i in range(events):
+            writer.submit((i % 2 + 1, start + timedelta(seconds=i), i // 2 + 1))
+        writer.stop(timeout=None)
+        elapsed = time.perf_counter() - started
+        results.append({'maxBatch': max_batch, 'events': events, 'seconds': elapsed, 'eventsPerSecond': events / elapsed})
+    return results
+
+
+BENCHMARKS = {
+    'sort_update': bench_sort_update,
+    'association': bench_association,
+    'pipeline': bench_pipeline,
+    'jpeg_encode': bench_jpeg_encode,
+    'frame_ring': bench_frame_ring,
+    'db_write': bench_db_write,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Counting service benchmark suite')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='Benchmarks to run (default: all)')
+    parser.add_argument('--crowds', nargs='+', type=int, default=[5, 10, 20, 40, 80, 160, 320, 640], help='People per frame')
+    parser.add_argument('--frames', type=int, default=300, help='Frames per scene')
+    parser.add_argument('--db-events', type=int, default=2000, help='Crossings written by db_write')
+    parser.add_argument('--quick', action='store_true', help='Small scenes for a fast smoke run')
+    parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+    args = parser.parse_args()
+    if args.quick:
+        args.crowds = [5, 20, 80]
+        args.frames = 60
+        args.db_events = 200
+    return args
+
+
+def main():
+    args = parse_args()
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': {},
+    }
+    for name in args.only or BENCHMARKS:
+        started = time.perf_counter()
+        report['results'][name] = BENCHMARKS[name](args)
+        print(f"{name} done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as out_file:
+            out_file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
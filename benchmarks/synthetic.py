@@ -0,0 +1,76 @@
+"""
+Synthetic scenes for the benchmarks: people walking up and down across a frame,
+reported as detector output rows so the pipeline can run without model weights.
+"""
+import cv2
+import numpy as np
+
+
+class SyntheticScene(object):
+    """
+    Keeps `people` boxes walking vertically through a width x height frame. Anyone
+    leaving the frame is replaced by a new walker entering from the top or bottom,
+    so the crowd density stays constant. detections() returns rows in the
+    ultralytics boxes.data layout [x1, y1, x2, y2, conf, cls] with positional
+    jitter and occasional missed detections; true crossings of the horizontal
+    middle line are recorded per frame for latency measurements.
+    """
+    def __init__(self, people=20, width=640, height=480, miss_rate=0.05, jitter=1.5, seed=0):
+        self.width = width
+        self.height = height
+        self.miss_rate = miss_rate
+        self.jitter = jitter
+        self.rng = np.random.default_rng(seed)
+        self.frame_index = 0
+        self.crossings = []  # frame indices at which a true centre crossed the middle line
+
+        self.size = np.zeros((people, 2))
+        self.pos = np.zeros((people, 2))
+        self.vel = np.zeros((people, 2))
+        for i in range(people):
+            self._spawn(i, anywhere=True)
+
+    def _spawn(self, i, anywhere=False):
+        w = self.rng.uniform(25, 45)
+        h = w * self.rng.uniform(2.0, 2.6)
+        down = self.rng.random() < 0.5
+        x = self.rng.uniform(0, self.width - w)
+        if anywhere:
+            y = self.rng.uniform(-h / 2, self.height - h / 2)
+        else:
+            y = -h + 1 if down else self.height - 1
+        speed = self.rng.uniform(2.0, 6.0)
+        self.size[i] = (w, h)
+        self.pos[i] = (x, y)
+        self.vel[i] = (self.rng.normal(0, 0.5), speed if down else -speed)
+
+    def step(self):
+        line = self.height / 2
+        before = self.pos[:, 1] + self.size[:, 1] / 2
+        self.pos += self.vel
+        after = self.pos[:, 1] + self.size[:, 1] / 2
+        crossed = np.count_nonzero((before - line) * (after - line) < 0)
+        self.crossings.extend([self.frame_index] * crossed)
+
+        gone = (self.pos[:, 1] > self.height) | (self.pos[:, 1] + self.size[:, 1] < 0)
+        for i in np.nonzero(gone)[0]:
+            self._spawn(i)
+        self.frame_index += 1
+
+    def boxes(self):
+        return np.concatenate((self.pos, self.pos + self.size), axis=1)
+
+    def detections(self):
+        boxes = self.boxes()
+        boxes = boxes + self.rng.normal(0, self.jitter, boxes.shape)
+        visible = self.rng.random(len(boxes)) >= self.miss_rate
+        conf = self.rng.uniform(0.4, 0.95, (len(boxes), 1))
+        cls = np.zeros((len(boxes), 1))
+        return np.concatenate((boxes, conf, cls), axis=1)[visible]
+
+    def render(self):
+        # A frame with textured background and filled boxes, for encode benchmarks
+        frame = self.rng.integers(0, 64, (self.height, self.width, 3), dtype=np.uint8)
+        for x1, y1, x2, y2 in self.boxes().astype(int):
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (200, 160, 120), -1)
+        return frame
@@ -0,0 +1,215 @@
+"""
+Load test for the viewer side of a running counting service: a swarm of local
+clients, all on one asyncio loop and using only the standard library, holds
+/video_feed connections and Socket.IO (long-polling) subscriptions open while the
+server's resident memory and thread count are sampled from /proc.
+
+Every level of --clients is held for --duration seconds. A share of the video
+clients (--slow-share) read at --slow-fps only, to check that slow viewers skip
+frames instead of slowing down the others or growing server memory.
+
+    SOCKETIO_ASYNC_MODE=gevent python app.py &
+    python -m benchmarks.viewer_load --pid $! --clients 50 100 200 400
+"""
+import argparse
+import asyncio
+import json
+import platform
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import numpy as np
+
+BOUNDARY = b'--frame\r\n'
+
+
+def process_status(pid):
+    # Resident memory (kB) and thread count of the server process, when it runs locally
+    if pid is None:
+        return {}
+    status = {}
+    with open(f'/proc/{pid}/status') as status_file:
+        for line in status_file:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'Threads'):
+                status[key] = int(value.split()[0])
+    return {'rssKb': status.get('VmRSS'), 'threads': status.get('Threads')}
+
+
+async def request(host, port, method, path, body=b''):
+    # One HTTP/1.1 request on its own connection; returns the response body
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f'{method} {path} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: close\r\n'
+                     f'Content-Type: text/plain;charset=UTF-8\r\nContent-Length: {len(body)}\r\n\r\n'.encode() + body)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    if b' 200 ' not in head.split(b'\r\n', 1)[0]:
+        raise ConnectionError(head.split(b'\r\n', 1)[0].decode(errors='replace'))
+    if b'transfer-encoding: chunked' in head.lower():
+        body = dechunk(body)
+    return body
+
+
+def dechunk(body):
+    chunks = []
+    while body:
+        size, _, body = body.partition(b'\r\n')
+        size = int(size.split(b';')[0], 16)
+        if size == 0:
+            break
+        chunks.append(body[:size])
+        body = body[size + 2:]
+    return b''.join(chunks)
+
+
+async def video_client(host, port, stream_id, stats, stop, read_interval):
+    # Holds one /video_feed connection and counts the multipart frames it receives.
+    # A slow client sleeps between reads, so the server sees its socket back up
+    started = time.monotonic()
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        stats['errors'] += 1
+        return
+    try:
+        writer.write(f'GET /video_feed/{stream_id} HTTP/1.1\r\nHost: {host}:{port}\r\n\r\n'.encode())
+        await writer.drain()
+        buffered = b''
+        while not stop.is_set():
+            data = await reader.read(65536)
+            if not data:
+                break
+            buffered += data
+            frames = buffered.count(BOUNDARY)
+            if frames:
+                if stats['firstFrame'] is None:
+                    stats['firstFrame'] = time.monotonic() - started
+                stats['frames'] += frames
+                buffered = buffered[buffered.rfind(BOUNDARY) + len(BOUNDARY):]
+            if read_interval:
+                await asyncio.sleep(read_interval)
+    except OSError:
+        stats['errors'] += 1
+    finally:
+        writer.close()
+
+
+async def socketio_client(host, port, stats, stop):
+    # Engine.IO v4 long-polling client that subscribes to every stream and counts
+    # the update_count events it receives, answering the server's pings
+    try:
+        handshake = await request(host, port, 'GET', '/socket.io/?EIO=4&transport=polling')
+        sid = json.loads(handshake[1:].split(b'\x1e')[0])['sid']
+        path = f'/socket.io/?EIO=4&transport=polling&sid={sid}'
+        await request(host, port, 'POST', path, b'40')
+        await request(host, port, 'POST', path, b'420["subscribe",{}]')
+        while not stop.is_set():
+            payload = await request(host, port, 'GET', path)
+            for packet in payload.split(b'\x1e'):
+                if packet == b'2':
+                    await request(host, port, 'POST', path, b'3')
+                elif packet.startswith(b'42["update_count"'):
+                    stats['updates'] += 1
+                elif packet == b'1':
+                    return
+    except (OSError, ConnectionError, ValueError, KeyError):
+        if not stop.is_set():
+            stats['errors'] += 1
+
+
+async def run_level(args, clients):
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    stop = asyncio.Event()
+    slow = int(round(clients * args.slow_share))
+    video_stats = [{'frames': 0, 'firstFrame': None, 'errors': 0} for _ in range(clients)]
+    socket_stats = [{'updates': 0, 'errors': 0} for _ in range(args.socketio_clients)]
+
+    tasks = [
+        asyncio.create_task(video_client(host, port, args.streams[i % len(args.streams)], stats, stop,
+                                         1.0 / args.slow_fps if i < slow else 0.0))
+        for i, stats in enumerate(video_stats)
+    ]
+    tasks += [asyncio.create_task(socketio_client(host, port, stats, stop)) for stats in socket_stats]
+
+    baseline = process_status(args.pid)
+    samples = []
+    started = time.monotonic()
+    while time.monotonic() - started < args.duration:
+        await asyncio.sleep(1.0)
+        samples.append(process_status(args.pid))
+    stop.set()
+    await asyncio.wait(tasks, timeout=5.0)
+    for task in tasks:
+        task.cancel()
+    elapsed = time.monotonic() - started
+
+    fast_fps = np.array([stats['frames'] / elapsed for stats in video_stats[slow:]] or [0.0])
+    slow_fps = np.array([stats['frames'] / elapsed for stats in video_stats[:slow]] or [0.0])
+    first_frames = [stats['firstFrame'] for stats in video_stats if stats['firstFrame'] is not None]
+    result = {
+        'videoClients': clients,
+        'slowClients': slow,
+        'socketioClients': args.socketio_clients,
+        'fpsP50': float(np.percentile(fast_fps, 50)),
+        'fpsP5': float(np.percentile(fast_fps, 5)),
+        'slowFpsP50': float(np.percentile(slow_fps, 50)),
+        'firstFrameP95Ms': float(np.percentile(first_frames, 95) * 1000.0) if first_frames else None,
+        'stalledClients': sum(1 for stats in video_stats if stats['frames'] == 0),
+        'videoErrors': sum(stats['errors'] for stats in video_stats),
+        'countUpdates': sum(stats['updates'] for stats in socket_stats),
+        'socketioErrors': sum(stats['errors'] for stats in socket_stats),
+    }
+    if args.pid is not None and samples:
+        peak_rss = max(sample['rssKb'] for sample in samples)
+        result.update({
+            'serverRssKb': peak_rss,
+            'serverRssPerClientKb': (peak_rss - baseline['rssKb']) / max(1, clients + args.socketio_clients),
+            'serverThreads': max(sample['threads'] for sample in samples),
+        })
+    return result
+
+
+async def run(args):
+    results = []
+    for clients in args.clients:
+        results.append(await run_level(args, clients))
+        # Let the server notice the closed connections before the next level
+        await asyncio.sleep(2.0)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent /video_feed and Socket.IO viewers against a running service')
+    parser.add_argument('--url', default='http://127.0.0.1:9000', help='Base URL of the service')
+    parser.add_argument('--pid', type=int, help='Server process id, to sample its memory and threads')
+    parser.add_argument('--clients', nargs='+', type=int, default=[50, 100, 200, 400], help='Video clients per level')
+    parser.add_argument('--streams', nargs='+', type=int, default=[0], help='/video_feed indexes to spread the clients over')
+    parser.add_argument('--socketio-clients', type=int, default=50, help='Socket.IO clients held open at every level')
+    parser.add_argument('--slow-share', type=float, default=0.1, help='Share of video clients that read slowly')
+    parser.add_argument('--slow-fps', type=float, default=1.0, help='Reads per second of a slow video client')
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds every level is held')
+    parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+    args = parser.parse_args()
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'url': args.url,
+        'results': asyncio.run(run(args)),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as out_file:
+            out_file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import threading
+import time
+import cv2
+from metrics import NullHistogram
+
+
+class MjpegBroadcaster(object):
+    """
+    Fan-out hub for the MJPEG preview of a single stream. Each annotated frame is
+    JPEG-encoded at most once, only the newest multipart chunk is kept, and every
+    subscriber pulls it at its own pace, so slow viewers skip frames instead of
+    holding up the pipeline.
+
+    With a green-thread server (gevent/eventlet) pass its sleep function as
+    poll_sleep: viewers then poll for the newest chunk and yield to the event loop
+    between polls instead of blocking an OS thread on the condition, so each
+    viewer costs a green thread rather than a thread per connection.
+    """
+    def __init__(self, preview_fps=10.0, jpeg_quality=80, encode_timer=None, poll_sleep=None):
+        self.encode_timer = encode_timer or NullHistogram()
+        self.frame_interval = 1.0 / preview_fps if preview_fps > 0 else 0.0
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), int(jpeg_quality)]
+        self.poll_sleep = poll_sleep
+        # Polling at half the preview interval keeps the added latency below one frame
+        self.poll_interval = self.frame_interval / 2 or 0.01
+
+        self.condition = threading.Condition()
+        self.chunk = None
+        self.chunk_id = 0
+        self.subscribers = 0
+        self.closed = False
+        self.last_encode = 0.0
+
+    def has_subscribers(self):
+        return self.subscribers > 0
+
+    def wants_frame(self):
+        # Whether publish() would encode a frame now
+        return self.has_subscribers() and time.monotonic() - self.last_encode >= self.frame_interval
+
+    def publish(self, frame):
+        # Encoding is skipped entirely while nobody is watching, and otherwise
+        # throttled to the preview frame rate independently of the counting rate
+        if not self.wants_frame():
+            return
+        now = time.monotonic()
+        self.last_encode = now
+
+        ret, buffer = cv2.imencode('.jpg', frame, self.encode_params)
+        if not ret:
+            return
+        # Joined straight from the encoder's buffer, without an intermediate tobytes() copy
+        chunk = b''.join((b'--frame\r\n'
+                          b'Content-Type: image/jpeg\r\n\r\n', buffer, b'\r\n'))
+        self.encode_timer.observe(time.monotonic() - now)
+        self.publish_chunk(chunk)
+
+    def publish_chunk(self, chunk):
+        # Hand an already encoded multipart chunk to every viewer
+        with self.condition:
+            self.chunk = chunk
+            self.chunk_id += 1
+            self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def _next_chunk(self, last_chunk_id):
+        # Newest chunk after last_chunk_id as (chunk_id, chunk), or None once closed
+        if self.poll_sleep is None:
+            with self.condition:
+                self.condition.wait_for(lambda: self.chunk_id != last_chunk_id or self.closed)
+                if self.chunk_id == last_chunk_id:
+                    return None
+                return self.chunk_id, self.chunk
+        while True:
+            # The lock is only ever held for a few assignments, so taking it here does
+            # not stall the event loop
+            with self.condition:
+                if self.chunk_id != last_chunk_id:
+                    return self.chunk_id, self.chunk
+                if self.closed:
+                    return None
+            self.poll_sleep(self.poll_interval)
+
+    def frames(self):
+        # Generator for a single viewer: yields the newest chunk each time one is available.
+        # A viewer that cannot keep up just gets the newest chunk once it is ready again,
+        # so nothing queues up per connection
+        with self.condition:
+            self.subscribers += 1
+        try:
+            last_chunk_id = 0
+            while True:
+                latest = self._next_chunk(last_chunk_id)
+                if latest is None:
+                    return
+                last_chunk_id, chunk = latest
+                yield chunk
+        finally:
+            with self.condition:
+                self.subscribers -= 1
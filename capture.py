@@ -0,0 +1,335 @@
+import shlex
+import shutil
+import subprocess
+import threading
+import time
+import cv2
+import numpy as np
+from config import stream_setting
+from framering import FrameRing
+from metrics import NullHistogram
+
+
+class OpenCvReader(object):
+    """
+    Decodes with cv2.VideoCapture at the source resolution, reusing one decode
+    buffer, and resizes every kept frame into the caller's buffer. With every > 1
+    the frames in between are only grabbed, so they skip the colour conversion,
+    the copy out of the decoder and the resize.
+    """
+    name = 'opencv'
+
+    def __init__(self, url, frame_size, every=1, resize_timer=None):
+        self.frame_size = frame_size
+        self.every = max(1, every)
+        self.resize_timer = resize_timer or NullHistogram()
+        self.cap = cv2.VideoCapture(url)
+        self.decoded = None
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self, out):
+        # Fill out, a (height, width, 3) frame, with the next kept frame; False at the end of the source
+        # Like the ffmpeg select filter, keep the first frame and every Nth after it
+        for _ in range(self.every - 1 if self.decoded is not None else 0):
+            if not self.cap.grab():
+                return False
+        ret, self.decoded = self.cap.read(self.decoded)
+        if not ret:
+            return False
+        started = time.perf_counter()
+        cv2.resize(self.decoded, self.frame_size, dst=out)
+        self.resize_timer.observe(time.perf_counter() - started)
+        return True
+
+    def interrupt(self):
+        pass  # VideoCapture cannot be released while another thread reads from it
+
+    def release(self):
+        self.cap.release()
+
+
+class FfmpegReader(object):
+    """
+    Decodes in an ffmpeg subprocess whose filter graph drops all but every Nth
+    frame and scales to the target size, so the full-resolution picture never
+    leaves the decoder. Frames come down the pipe as I420, half the bytes of BGR,
+    and are converted straight into the caller's buffer (e.g. a FrameRing slot):
+    at the target size cv2's conversion is far cheaper than swscale's BGR output.
+    """
+    name = 'ffmpeg'
+
+    def __init__(self, url, frame_size, every=1, ffmpeg='ffmpeg', input_options=None, timeout=10.0):
+        width, height = frame_size
+        if input_options is None:
+            input_options = default_input_options(url, timeout)
+        # I420 needs even dimensions; other sizes are read as BGR directly
+        self.planar = width % 2 == 0 and height % 2 == 0
+        filters = [f'scale={width}:{height}:flags=area']
+        if every > 1:
+            filters.insert(0, f'select=not(mod(n\\,{every}))')
+        command = [ffmpeg, '-nostdin', '-hide_banner', '-loglevel', 'error', *input_options, '-i', url,
+                   '-an', '-sn', '-vf', ','.join(filters), '-fps_mode', 'passthrough',
+                   '-pix_fmt', 'yuv420p' if self.planar else 'bgr24', '-f', 'rawvideo', 'pipe:1']
+        self.process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, bufsize=0)
+        self.raw = np.empty((height * 3 // 2, width) if self.planar else (height, width, 3), dtype=np.uint8)
+        self.pending = False
+
+    def isOpened(self):
+        # ffmpeg reports a source it cannot open or decode by exiting; reading the first
+        # frame here is what lets the grabber fall back to OpenCV for it
+        self.pending = self._read_raw()
+        return self.pending
+
+    def _read_raw(self):
+        view = memoryview(self.raw).cast('B')
+        filled = 0
+        while filled < len(view):
+            count = self.process.stdout.readinto(view[filled:])
+            if not count:
+                return False
+            filled += count
+        return True
+
+    def read(self, out):
+        # Fill out, a (height, width, 3) frame, with the next kept frame; False at the end of the source
+        if self.pending:
+            self.pending = False
+        elif not self._read_raw():
+            return False
+        if self.planar:
+            cv2.cvtColor(self.raw, cv2.COLOR_YUV2BGR_I420, dst=out)
+        else:
+            np.copyto(out, self.raw)
+        return True
+
+    def interrupt(self):
+        # Unblocks a read() waiting on a stalled source from another thread
+        if self.process.poll() is None:
+            self.process.kill()
+
+    def release(self):
+        self.interrupt()
+        self.process.wait()
+        self.process.stdout.close()
+
+
+def default_input_options(url, timeout):
+    # Like OpenCV's FFmpeg backend, RTSP goes over TCP (the ffmpeg CLI tries UDP first)
+    # and a source silent for timeout seconds makes ffmpeg exit rather than wait forever
+    if url.lower().startswith('rtsp://'):
+        return ['-rtsp_transport', 'tcp', '-timeout', str(int(timeout * 1000000))]
+    return []
+
+
+class FrameGrabber(threading.Thread):
+    """
+    Reads a video source on its own thread and keeps only the newest frame, so a
+    slow consumer always gets the most recent picture instead of working through a
+    backlog in the decoder buffer. Frames replaced before anyone read them are
+    counted as dropped. When the source fails to open or stops delivering frames
+    the grabber reconnects with exponential backoff. A watchdog thread interrupts
+    a reader that has not delivered a frame for stall_timeout seconds, so a source
+    that stalls without closing the connection is reconnected too.
+
+    Frames are decoded by an FfmpegReader at the target size when ffmpeg is
+    available (decoder='auto' or 'ffmpeg'), and otherwise, or for a source ffmpeg
+    cannot decode, by an OpenCvReader. With every > 1 only every Nth frame of the
+    source is kept. Either way each frame lands straight in a slot of the
+    grabber's FrameRing, so steady-state capture allocates nothing. read() hands
+    out slot indexes, which the consumer gives back with release().
+    """
+    def __init__(self, url, name='capture', min_backoff=1.0, max_backoff=30.0,
+                 frame_size=(640, 480), slots=4, resize_timer=None,
+                 decoder='opencv', every=1, ffmpeg='ffmpeg', ffmpeg_input_options=None, stall_timeout=10.0):
+        super().__init__(name=name, daemon=True)
+        if decoder not in ('auto', 'ffmpeg', 'opencv'):
+            raise ValueError(f"Invalid capture decoder {decoder!r}, expected auto, ffmpeg or opencv")
+        self.url = url
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.frame_size = frame_size
+        self.resize_timer = resize_timer or NullHistogram()
+        self.decoder = decoder
+        self.every = max(1, every)
+        self.ffmpeg = ffmpeg
+        self.ffmpeg_input_options = ffmpeg_input_options  # None: default_input_options()
+        self.stall_timeout = stall_timeout
+        self.reader = None  # reader of the current connection
+        self.frame_at = time.monotonic()  # when the current reader was opened or last delivered a frame
+        self.wakeup = threading.Event()  # set by stop() for the watchdog
+        self.scratch = None  # frame decoded while every ring slot is in use
+        # One slot for the newest frame, one per consumer and one being written
+        self.ring = FrameRing(slots, (frame_size[1], frame_size[0], 3))
+
+        self.condition = threading.Condition()
+        self.slot = None  # slot of the newest frame, referenced by the grabber
+        self.frame_id = 0
+        self.consumed_id = 0
+        self.dropped_frames = 0
+        self.reconnects = 0
+        self.connected = False
+        self.stopped = False
+
+    @classmethod
+    def from_env(cls, stream_id, url, **kwargs):
+        # Grabber of a stream with its CAPTURE_DECODER, DECODE_EVERY, FFMPEG_BIN,
+        # FFMPEG_INPUT_OPTIONS and CAPTURE_STALL_TIMEOUT_S settings. With the default
+        # decoder, auto, ffmpeg is used whenever it is installed; FFMPEG_INPUT_OPTIONS,
+        # when set, replaces the RTSP transport and timeout options
+        decoder = stream_setting('CAPTURE_DECODER', stream_id, 'auto', str)
+        ffmpeg = stream_setting('FFMPEG_BIN', stream_id, 'ffmpeg', str)
+        if decoder == 'auto' and shutil.which(ffmpeg) is None:
+            decoder = 'opencv'
+        input_options = stream_setting('FFMPEG_INPUT_OPTIONS', stream_id, '', str)
+        return cls(url, decoder=decoder, every=stream_setting('DECODE_EVERY', stream_id, 1, int), ffmpeg=ffmpeg,
+                   ffmpeg_input_options=shlex.split(input_options) if input_options else None,
+                   stall_timeout=stream_setting('CAPTURE_STALL_TIMEOUT_S', stream_id, 10.0), **kwargs)
+
+    def _attach(self, reader):
+        # Make reader the one the watchdog and stop() interrupt, with a full stall_timeout ahead of it
+        self.frame_at = time.monotonic()
+        self.reader = reader
+
+    def _open(self):
+        # Reader for a new connection to the source, or None when it cannot be opened
+        if self.decoder in ('auto', 'ffmpeg'):
+            try:
+                reader = FfmpegReader(self.url, self.frame_size, self.every, self.ffmpeg, self.ffmpeg_input_options,
+                                      self.stall_timeout)
+            except OSError as e:
+                print(f"Error: Could not start {self.ffmpeg}: {e}")
+                reader = None
+            if reader is not None:
+                # Registered before the first read so stop() can interrupt a source that never delivers
+                self._attach(reader)
+                if not self.stopped and reader.isOpened():
+                    return reader
+                self.reader = None
+                reader.release()
+            if self.stopped or self.decoder == 'ffmpeg':
+                return None
+            print(f"Error: ffmpeg could not decode {self.url}, trying OpenCV")
+
+        reader = OpenCvReader(self.url, self.frame_size, self.every, self.resize_timer)
+        if reader.isOpened():
+            return reader
+        reader.release()
+        return None
+
+    def run(self):
+        if not self.url:
+            print(f"Error: No video source configured for {self.name}")
+            self.stop()
+            return
+
+        threading.Thread(target=self._watchdog, name=f'{self.name}-watchdog', daemon=True).start()
+        backoff = self.min_backoff
+        while not self.stopped:
+            reader = self._open()
+            if reader is None:
+                if self.stopped:
+                    break
+                print(f"Error: Could not open video source: {self.url}, retrying in {backoff:.0f}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+
+            self._attach(reader)
+            try:
+                while not self.stopped:
+                    if not self._store(reader):
+                        if not self.stopped:
+                            print(f"Error: Could not read frame from video source: {self.url}, reconnecting")
+                        break
+                    self.connected = True
+                    backoff = self.min_backoff
+            finally:
+                self.reader = None
+                reader.release()
+                self.connected = False
+
+            if not self.stopped:
+                self.reconnects += 1
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def _watchdog(self):
+        interrupted = None
+        while not self.wakeup.wait(min(1.0, self.stall_timeout / 4)):
+            reader = self.reader
+            if reader is None or reader is interrupted:
+                continue
+            if time.monotonic() - self.frame_at > self.stall_timeout:
+                print(f"Error: No frame from video source {self.url} for {self.stall_timeout:.0f}s, reconnecting")
+                interrupted = reader
+                reader.interrupt()
+
+    def _store(self, reader):
+        # Read the next frame into a free slot and make it the newest; False when the source ended
+        slot = self.ring.acquire()
+        if slot is None:
+            # Every slot is still held by a consumer; this frame would be replaced unread anyway,
+            # but the source still has to be drained
+            if self.scratch is None:
+                self.scratch = np.empty_like(self.ring.frame(0))
+            if not reader.read(self.scratch):
+                return False
+            self.frame_at = time.monotonic()
+            self.dropped_frames += 1
+            return True
+        try:
+            ret = reader.read(self.ring.frame(slot))
+        except Exception:
+            self.ring.release(slot)
+            raise
+        if not ret:
+            self.ring.release(slot)
+            return False
+        self.frame_at = time.monotonic()
+
+        with self.condition:
+            if self.frame_id != self.consumed_id:
+                self.dropped_frames += 1
+            previous, self.slot = self.slot, slot
+            self.frame_id += 1
+            self.condition.notify_all()
+        if previous is not None:
+            self.ring.release(previous)
+        return True
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        self.wakeup.set()
+        reader = self.reader
+        if reader is not None:
+            reader.interrupt()
+
+    def close(self, timeout=5.0):
+        # Stop capturing and free the ring once the capture thread is done with it
+        self.stop()
+        if self.is_alive():
+            self.join(timeout)
+        if not self.is_alive():
+            self.ring.close()
+
+    def read(self, last_frame_id, timeout=1.0):
+        # Wait for a frame newer than last_frame_id. Returns (frame_id, slot), with a
+        # reference to the ring slot that the caller must release(), or
+        # (last_frame_id, None) on timeout or once the grabber has been stopped
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame_id != last_frame_id or self.stopped, timeout)
+            if self.frame_id == last_frame_id or self.slot is None:
+                return last_frame_id, None
+            self.consumed_id = self.frame_id
+            self.ring.retain(self.slot)
+            return self.frame_id, self.slot
+
+    def frame(self, slot):
+        return self.ring.frame(slot)
+
+    def release(self, slot):
+        self.ring.release(slot)
@@ -0,0 +1,48 @@
+import os
+import time
+from datetime import datetime
+import numpy as np
+
+
+# Write the per-stream state dicts (arrays or scalars) to path as one .npz file.
+# The file is replaced atomically, so a crash mid-write leaves the previous checkpoint
+def save_checkpoint(path, streams):
+    arrays = {
+        'saved_at': np.array(time.time()),
+        'date': np.array(datetime.now().date().isoformat()),
+        'streams': np.array(len(streams)),
+    }
+    for i, state in enumerate(streams):
+        for key, value in state.items():
+            arrays[f'{i}/{key}'] = np.asarray(value)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as checkpoint_file:
+        np.savez(checkpoint_file, **arrays)
+    os.replace(tmp_path, path)
+
+
+# Read the per-stream state dicts back. Returns None when there is no checkpoint, or it
+# is older than max_age seconds, from another day or for a different number of streams
+def load_checkpoint(path, streams, max_age):
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            age = time.time() - float(data['saved_at'])
+            if age > max_age:
+                print(f"Ignoring checkpoint {path}: saved {age:.0f}s ago")
+                return None
+            if str(data['date']) != datetime.now().date().isoformat() or int(data['streams']) != streams:
+                print(f"Ignoring checkpoint {path}: saved on another day or for other streams")
+                return None
+            states = [{} for _ in range(streams)]
+            for name in data.files:
+                index, _, key = name.partition('/')
+                if key:
+                    states[int(index)][key] = data[name]
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error while loading checkpoint {path}: {e}")
+        return None
+    print(f"Resuming from checkpoint {path} saved {age:.1f}s ago")
+    return states
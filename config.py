@@ -0,0 +1,11 @@
+import os
+
+# Read a per-stream setting: NAME_<stream_id> overrides NAME, which overrides the default.
+# stream_id is 1-based, matching RSTP_LINK_<n>
+def stream_setting(name, stream_id, default, cast=float):
+    value = os.getenv(f'{name}_{stream_id}', os.getenv(name))
+    if value is None or value == '':
+        return default
+    if cast is bool:
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return cast(value)
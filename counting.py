@@ -0,0 +1,137 @@
+import numpy as np
+
+
+class LineCrossingCounter(object):
+    """
+    Counts tracks whose centre crosses a line segment, at any angle. Each track's
+    last centre strictly on one side of the line is remembered (as arrays, so a
+    frame's tracks are checked with a few NumPy operations), and a crossing is
+    reported when a later centre lands on the other side and the path between the
+    two passes through the segment, so fast walkers are counted even when they
+    skip over the line between two detector frames.
+
+    Moving from the left of start->end to its right is "in" (for the default
+    horizontal line drawn left to right, that is walking down the frame); the
+    opposite is "out". Swap the endpoints to flip the direction.
+
+    Centres within margin px of the line count as on it, so a track's side only
+    changes once it has clearly left the line; someone standing on the line is
+    not counted on every jitter of their box. Each track is also counted at most
+    once per direction, and every crossing says whether it is the track's first,
+    for totals that count each person once whichever way they went.
+    """
+    def __init__(self, start, end, margin=10.0):
+        self.start = (float(start[0]), float(start[1]))
+        self.end = (float(end[0]), float(end[1]))
+        self.margin = float(margin)
+        # Last centre clearly on one side of the line of every known track, sorted by id,
+        # and the directions it was counted in (IN_BIT | OUT_BIT)
+        self.track_ids = np.zeros(0, dtype=int)
+        self.last_points = np.zeros((0, 2))
+        self.last_sides = np.zeros(0, dtype=int)
+        self.counted = np.zeros(0, dtype=int)
+        self.count_in = 0
+        self.count_out = 0
+
+    IN_BIT = 1
+    OUT_BIT = 2
+
+    def sides(self, points):
+        # Side of the line of each (x, y) row: 1 (right of start->end), -1 (left) or 0 (within
+        # margin px of it)
+        (sx, sy), (ex, ey) = self.start, self.end
+        cross = (ex - sx) * (points[:, 1] - sy) - (ey - sy) * (points[:, 0] - sx)
+        distance = cross / max(np.hypot(ex - sx, ey - sy), 1e-9)
+        sides = np.sign(distance).astype(int)
+        sides[np.abs(distance) <= self.margin] = 0
+        return sides
+
+    def _crosses_segment(self, p0, p1):
+        # Whether each path p0 -> p1, whose ends lie on opposite sides of the infinite
+        # line, passes through the finite segment start -> end
+        (sx, sy), (ex, ey) = self.start, self.end
+        dx, dy = p1[:, 0] - p0[:, 0], p1[:, 1] - p0[:, 1]
+        cross = (sx - p0[:, 0]) * dy - (sy - p0[:, 1]) * dx
+        cross_end = (ex - p0[:, 0]) * dy - (ey - p0[:, 1]) * dx
+        return ((cross > 0) != (cross_end > 0)) | (cross == 0) | (cross_end == 0)
+
+    def update(self, tracked_objects, live_ids=None):
+        # tracked_objects are Sort output rows [x1, y1, x2, y2, id]. live_ids are the ids
+        # Sort is still keeping alive; state for any other track is dropped. Without
+        # live_ids, tracks missing from tracked_objects are dropped.
+        # Returns a list of (track_id, 'in' | 'out', first) for the crossings in this frame,
+        # where first is whether the track had not been counted in either direction yet.
+        tracked = np.asarray(tracked_objects, dtype=float).reshape(-1, 5)
+        seen = tracked[:, 4].astype(int)
+        points = (tracked[:, 0:2] + tracked[:, 2:4]) / 2.0
+        sides = self.sides(points)
+        off_line = sides != 0
+        ids, points, sides = seen[off_line], points[off_line], sides[off_line]
+
+        # Tracks seen before whose centre moved to the other side are crossing candidates
+        pos = np.searchsorted(self.track_ids, ids)
+        known = pos < len(self.track_ids)
+        known[known] = self.track_ids[pos[known]] == ids[known]
+        candidates = np.zeros(len(ids), dtype=bool)
+        candidates[known] = self.last_sides[pos[known]] != sides[known]
+        if candidates.any():
+            index = np.nonzero(candidates)[0]
+            crossed = self._crosses_segment(self.last_points[pos[index]], points[index])
+            candidates[index[~crossed]] = False
+
+        crossings = []
+        for i in np.nonzero(candidates)[0]:
+            bit = self.IN_BIT if sides[i] > 0 else self.OUT_BIT
+            counted = self.counted[pos[i]]
+            if counted & bit:
+                continue  # already counted in this direction, e.g. walking back and forth
+            self.counted[pos[i]] = counted | bit
+            if bit == self.IN_BIT:
+                self.count_in += 1
+                crossings.append((int(ids[i]), 'in', counted == 0))
+            else:
+                self.count_out += 1
+                crossings.append((int(ids[i]), 'out', counted == 0))
+
+        # Remember the new positions, then drop tracks that are gone
+        self.last_points[pos[known]] = points[known]
+        self.last_sides[pos[known]] = sides[known]
+        track_ids = np.concatenate((self.track_ids, ids[~known]))
+        last_points = np.concatenate((self.last_points, points[~known]))
+        last_sides = np.concatenate((self.last_sides, sides[~known]))
+        counted = np.concatenate((self.counted, np.zeros(np.count_nonzero(~known), dtype=int)))
+        keep = np.isin(track_ids, seen if live_ids is None else np.asarray(live_ids, dtype=int))
+        order = np.argsort(track_ids[keep], kind='stable')
+        self.track_ids = track_ids[keep][order]
+        self.last_points = last_points[keep][order]
+        self.last_sides = last_sides[keep][order]
+        self.counted = counted[keep][order]
+        return crossings
+
+    def state(self):
+        # Per-track state and totals as arrays, for checkpoints
+        return {
+            'track_ids': self.track_ids.copy(),
+            'last_points': self.last_points.copy(),
+            'last_sides': self.last_sides.copy(),
+            'counted': self.counted.copy(),
+            'count_in': np.array(self.count_in),
+            'count_out': np.array(self.count_out),
+        }
+
+    def load_state(self, state):
+        self.track_ids = np.array(state['track_ids'], dtype=int)
+        self.last_points = np.array(state['last_points'], dtype=float).reshape(-1, 2)
+        self.last_sides = np.array(state['last_sides'], dtype=int)
+        self.counted = np.array(state.get('counted', np.zeros(len(self.track_ids))), dtype=int)
+        self.count_in = int(state['count_in'])
+        self.count_out = int(state['count_out'])
+
+    @classmethod
+    def parse(cls, spec, frame_size, margin=10.0):
+        # spec is "x1,y1,x2,y2"; empty means a horizontal line across the middle of the frame
+        width, height = frame_size
+        if not spec:
+            return cls((0, height // 2), (width, height // 2), margin)
+        x1, y1, x2, y2 = [int(v) for v in spec.split(',')]
+        return cls((x1, y1), (x2, y2), margin)
@@ -0,0 +1,453 @@
+"""
+Person detectors behind one interface, so the counting service can run the
+model on whichever runtime is fastest on the site's CPUs.
+
+Every backend turns a list of BGR frames into one array per frame of
+[x1, y1, x2, y2, conf, cls] rows in frame coordinates, the same layout as
+ultralytics' boxes.data:
+
+    ultralytics  the .pt model through ultralytics/PyTorch (the reference)
+    onnx         an exported .onnx model through ONNX Runtime
+    openvino     an exported OpenVINO IR (.xml) model
+
+The exported backends letterbox the frames and run NMS themselves and do not
+import torch or ultralytics at all. Models are exported, optionally int8
+quantized on frames of a local clip, and checked against the reference with
+
+    python -m detectors export yolov8n.pt --format onnx --int8 --calibration clip.mp4
+    python -m detectors check clip.mp4 --backend onnx --model yolov8n_int8.onnx
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+import cv2
+import numpy as np
+
+BACKENDS = ('ultralytics', 'onnx', 'openvino')
+
+# Padding value ultralytics letterboxes with; exported models were trained on it
+LETTERBOX_COLOR = 114
+
+
+# Parse an input size given as "640" or "<height>,<width>" into (height, width); empty means automatic
+def parse_imgsz(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, int):
+        return (value, value)
+    if isinstance(value, (tuple, list)):
+        height, width = value
+        return (int(height), int(width))
+    parts = [int(part) for part in str(value).split(',')]
+    if len(parts) == 1:
+        return (parts[0], parts[0])
+    if len(parts) != 2:
+        raise ValueError(f"Invalid detector input size {value!r}, expected <size> or <height>,<width>")
+    return tuple(parts)
+
+
+def letterbox(frame, imgsz, out):
+    # Resize frame into out, an imgsz canvas, keeping its aspect ratio and centring it
+    # between padding. Returns the gain and the (left, top) padding for mapping boxes back
+    height, width = frame.shape[:2]
+    gain = min(imgsz[0] / height, imgsz[1] / width)
+    new_width, new_height = int(round(width * gain)), int(round(height * gain))
+    pad_x, pad_y = (imgsz[1] - new_width) / 2, (imgsz[0] - new_height) / 2
+    left, top = int(round(pad_x - 0.1)), int(round(pad_y - 0.1))
+
+    out[...] = LETTERBOX_COLOR
+    if (new_width, new_height) != (width, height):
+        frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    out[top:top + new_height, left:left + new_width] = frame
+    return gain, (left, top)
+
+
+def to_blob(canvases, dtype=np.float32):
+    # (N, H, W, 3) BGR uint8 canvases to the (N, 3, H, W) RGB [0, 1] model input
+    blob = canvases[..., ::-1].transpose(0, 3, 1, 2).astype(dtype)
+    blob *= 1.0 / 255.0
+    return np.ascontiguousarray(blob)
+
+
+def non_max_suppression(output, conf, iou, max_det=300):
+    # Decode one image of a YOLOv8-style head, (4 + classes, anchors) of centre/size
+    # boxes and class scores, into at most max_det [x1, y1, x2, y2, conf, cls] rows
+    # with per-class NMS
+    if output.shape[0] > output.shape[1]:
+        output = output.T
+    scores = output[4:]
+    classes = scores.argmax(axis=0)
+    confidences = scores[classes, np.arange(scores.shape[1])]
+    keep = confidences >= conf
+    if not keep.any():
+        return np.empty((0, 6), dtype=np.float32)
+
+    centres = output[:4, keep].T
+    confidences, classes = confidences[keep], classes[keep]
+    boxes = np.empty((len(centres), 4), dtype=np.float32)
+    boxes[:, :2] = centres[:, :2] - centres[:, 2:] / 2
+    boxes[:, 2:] = centres[:, :2] + centres[:, 2:] / 2
+
+    # Offsetting every class by more than the image size makes one NMS pass per-class
+    offset = classes[:, None].astype(np.float32) * 7680.0
+    shifted = boxes + offset
+    rects = np.concatenate((shifted[:, :2], shifted[:, 2:] - shifted[:, :2]), axis=1)
+    indexes = cv2.dnn.NMSBoxes(rects.tolist(), confidences.tolist(), conf, iou, top_k=max_det)
+    indexes = np.asarray(indexes, dtype=np.int64).reshape(-1)[:max_det]
+
+    return np.concatenate((boxes[indexes], confidences[indexes, None],
+                           classes[indexes, None].astype(np.float32)), axis=1)
+
+
+def scale_boxes(detections, gain, pad, frame_shape):
+    # Map letterboxed boxes back onto the original frame, in place
+    detections[:, [0, 2]] -= pad[0]
+    detections[:, [1, 3]] -= pad[1]
+    detections[:, :4] /= gain
+    detections[:, [0, 2]] = np.clip(detections[:, [0, 2]], 0, frame_shape[1])
+    detections[:, [1, 3]] = np.clip(detections[:, [1, 3]], 0, frame_shape[0])
+    return detections
+
+
+class Detector(object):
+    """
+    Detector interface used by BatchInferenceScheduler, the pipeline and the
+    CLIs. detect_batch() takes a list of BGR frames, which may differ in size
+    (e.g. cropped regions of interest), and returns one (N, 6) array per frame.
+    """
+    name = None
+
+    def detect_batch(self, frames):
+        raise NotImplementedError
+
+    def __call__(self, frame):
+        return self.detect_batch([frame])[0]
+
+
+class UltralyticsDetector(Detector):
+    """
+    The .pt model through ultralytics. Without a fixed imgsz every batch runs at
+    the smallest stride-aligned size that holds its largest frame, so cropped
+    regions of interest are not letterboxed up to the full model size.
+    """
+    name = 'ultralytics'
+
+    def __init__(self, model, conf=0.25, iou=0.7, imgsz=None, threads=None):
+        from ultralytics import YOLO
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = YOLO(model)
+        self.conf = conf
+        self.iou = iou
+        self.imgsz = imgsz
+
+    def _batch_imgsz(self, frames):
+        height = max(frame.shape[0] for frame in frames)
+        width = max(frame.shape[1] for frame in frames)
+        return (-(-height // 32) * 32, -(-width // 32) * 32)
+
+    def detect_batch(self, frames):
+        results = self.model(frames, conf=self.conf, iou=self.iou,
+                             imgsz=list(self.imgsz or self._batch_imgsz(frames)), verbose=False)
+        return [result.boxes.data.cpu().numpy() for result in results]
+
+
+class ExportedDetector(Detector):
+    """
+    Shared part of the backends that run an exported model: frames are
+    letterboxed into a reused input canvas, run through the runtime in batches
+    of the size the model was exported with (any size for dynamic models), and
+    decoded with per-class NMS on the CPU.
+    """
+    def __init__(self, conf, iou, imgsz, input_shape, input_dtype):
+        batch, _, height, width = input_shape
+        model_imgsz = (height, width) if isinstance(height, int) and isinstance(width, int) else None
+        if model_imgsz and imgsz and tuple(imgsz) != model_imgsz:
+            raise ValueError(f"Model was exported for input size {model_imgsz}, not {tuple(imgsz)}")
+        self.imgsz = model_imgsz or tuple(imgsz or (640, 640))
+        self.batch = batch if isinstance(batch, int) and batch > 0 else None
+        self.input_dtype = input_dtype
+        self.conf = conf
+        self.iou = iou
+        self.canvases = np.empty((0,) + self.imgsz + (3,), dtype=np.uint8)
+
+    def _run(self, blob):
+        raise NotImplementedError
+
+    def detect_batch(self, frames):
+        count = len(frames)
+        size = self.batch or count
+        padded = -(-count // size) * size
+        if len(self.canvases) < padded:
+            self.canvases = np.empty((padded,) + self.imgsz + (3,), dtype=np.uint8)
+        canvases = self.canvases[:padded]
+        canvases[count:] = LETTERBOX_COLOR
+        transforms = [letterbox(frame, self.imgsz, canvases[i]) for i, frame in enumerate(frames)]
+
+        outputs = []
+        for start in range(0, padded, size):
+            outputs.extend(self._run(to_blob(canvases[start:start + size], self.input_dtype)))
+
+        detections = []
+        for frame, (gain, pad), output in zip(frames, transforms, outputs):
+            rows = non_max_suppression(np.asarray(output, dtype=np.float32), self.conf, self.iou)
+            detections.append(scale_boxes(rows, gain, pad, frame.shape))
+        return detections
+
+
+class OnnxDetector(ExportedDetector):
+    name = 'onnx'
+
+    def __init__(self, model, conf=0.25, iou=0.7, imgsz=None, threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model, options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        super().__init__(conf, iou, imgsz, model_input.shape,
+                         np.float16 if model_input.type == 'tensor(float16)' else np.float32)
+
+    def _run(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoDetector(ExportedDetector):
+    name = 'openvino'
+
+    def __init__(self, model, conf=0.25, iou=0.7, imgsz=None, threads=None):
+        import openvino as ov
+        if os.path.isdir(model):
+            model = openvino_xml(model)
+        config = {'PERFORMANCE_HINT': 'LATENCY'}
+        if threads:
+            config['INFERENCE_NUM_THREADS'] = threads
+        self.compiled = ov.Core().compile_model(model, 'CPU', config)
+        shape = [dimension.get_length() if dimension.is_static else None
+                 for dimension in self.compiled.input(0).get_partial_shape()]
+        super().__init__(conf, iou, imgsz, shape, np.float32)
+        self.output = self.compiled.output(0)
+
+    def _run(self, blob):
+        return self.compiled(blob)[self.output]
+
+
+# Model file of an OpenVINO export directory such as yolov8n_openvino_model/
+def openvino_xml(directory):
+    models = sorted(glob.glob(os.path.join(directory, '*.xml')))
+    if not models:
+        raise IOError(f"No OpenVINO model (.xml) in {directory}")
+    return models[0]
+
+
+# Build a detector; imgsz is parsed with parse_imgsz and threads of 0 or None keep the runtime default
+def load_detector(backend='ultralytics', model='yolov8n.pt', conf=0.25, iou=0.7, imgsz=None, threads=None):
+    detectors = {'ultralytics': UltralyticsDetector, 'onnx': OnnxDetector, 'openvino': OpenVinoDetector}
+    if backend not in detectors:
+        raise ValueError(f"Invalid detector backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    return detectors[backend](model, conf=conf, iou=iou, imgsz=parse_imgsz(imgsz), threads=threads or None)
+
+
+def read_frames(path, count, frame_size=(640, 480)):
+    # Up to count frames spread evenly over a clip, resized like the stream workers do
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video file: {path}")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    wanted = set(np.linspace(0, total - 1, count).astype(int).tolist()) if total > count else None
+    frames = []
+    index = 0
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if wanted is None or index in wanted:
+            frames.append(cv2.resize(frame, frame_size))
+        index += 1
+    cap.release()
+    if not frames:
+        raise IOError(f"No frames could be read from {path}")
+    return frames
+
+
+def calibration_blobs(frames, imgsz):
+    canvas = np.empty((1,) + tuple(imgsz) + (3,), dtype=np.uint8)
+    for frame in frames:
+        letterbox(frame, imgsz, canvas[0])
+        yield to_blob(canvas)
+
+
+def quantize_onnx(path, output, frames, imgsz):
+    # Static int8 (QDQ) quantization calibrated on frames. The detection head, the last
+    # /model.<n>/ block of an ultralytics export, stays in float: quantizing its box
+    # decoding costs far more accuracy than it saves time
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    graph = onnx.load(path).graph
+    blocks = [int(match.group(1)) for match in (re.match(r'/model\.(\d+)/', node.name) for node in graph.node) if match]
+    head = f'/model.{max(blocks)}/' if blocks else None
+    excluded = [node.name for node in graph.node if head and node.name.startswith(head)]
+    input_name = graph.input[0].name
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self.blobs = calibration_blobs(frames, imgsz)
+
+        def get_next(self):
+            blob = next(self.blobs, None)
+            return None if blob is None else {input_name: blob}
+
+    quantize_static(path, output, Reader(), quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                    nodes_to_exclude=excluded)
+    return output
+
+
+def quantize_openvino(path, output, frames, imgsz):
+    # Post-training int8 quantization with NNCF, keeping the box decoding in float
+    import nncf
+    import openvino as ov
+
+    model = ov.Core().read_model(path)
+    quantized = nncf.quantize(model, nncf.Dataset(list(calibration_blobs(frames, imgsz))),
+                              preset=nncf.QuantizationPreset.MIXED, subset_size=len(frames),
+                              ignored_scope=nncf.IgnoredScope(types=['Multiply', 'Subtract', 'Sigmoid']))
+    ov.save_model(quantized, output)
+    return output
+
+
+def export(args):
+    from ultralytics import YOLO
+    imgsz = parse_imgsz(args.imgsz)
+    path = YOLO(args.weights).export(format=args.format, imgsz=list(imgsz), dynamic=args.dynamic,
+                                     batch=args.batch, simplify=args.format == 'onnx')
+    if args.format == 'openvino':
+        path = openvino_xml(path)
+    print(f"Exported {args.weights} to {path}")
+
+    if args.int8:
+        if not args.calibration:
+            raise ValueError("--int8 needs a --calibration clip")
+        frames = read_frames(args.calibration, args.calibration_frames, (args.width, args.height))
+        stem, extension = os.path.splitext(path)
+        quantize = quantize_onnx if args.format == 'onnx' else quantize_openvino
+        path = quantize(path, f'{stem}_int8{extension}', frames, imgsz)
+        print(f"Quantized to int8 on {len(frames)} frames of {args.calibration}: {path}")
+    return path
+
+
+def match_boxes(reference, candidate, min_iou):
+    # Pairs of reference/candidate rows with IoU >= min_iou, matched one to one
+    from sort import iou_batch, linear_assignment
+    if len(reference) == 0 or len(candidate) == 0:
+        return np.empty((0, 2), dtype=int), np.empty(0)
+    ious = iou_batch(candidate[:, :4], reference[:, :4]).T
+    pairs = linear_assignment(-ious)
+    pairs = pairs[ious[pairs[:, 0], pairs[:, 1]] >= min_iou]
+    return pairs, ious[pairs[:, 0], pairs[:, 1]]
+
+
+def timed_detections(detector, frames, classes):
+    detections, samples = [], []
+    detector(frames[0])  # warm-up; the first run includes graph compilation
+    for frame in frames:
+        started = time.perf_counter()
+        rows = detector(frame)
+        samples.append(time.perf_counter() - started)
+        detections.append(rows[np.isin(rows[:, 5].astype(int), classes)] if len(rows) else rows)
+    samples = np.array(samples) * 1000.0
+    return detections, {'meanMs': float(samples.mean()), 'p50Ms': float(np.percentile(samples, 50)),
+                        'fps': float(1000.0 / samples.mean())}
+
+
+def check(args):
+    # Compare the person boxes of a backend against the reference backend on a clip
+    frames = read_frames(args.clip, args.frames, (args.width, args.height))
+    options = dict(conf=args.conf, imgsz=args.imgsz, threads=args.threads)
+    reference, reference_timing = timed_detections(
+        load_detector(args.reference_backend, args.reference_model, **options), frames, args.classes)
+    candidate, candidate_timing = timed_detections(
+        load_detector(args.backend, args.model, **options), frames, args.classes)
+
+    matched = reference_boxes = candidate_boxes = same_count = 0
+    ious, conf_deltas = [], []
+    for expected, actual in zip(reference, candidate):
+        pairs, pair_ious = match_boxes(expected, actual, args.min_iou)
+        matched += len(pairs)
+        reference_boxes += len(expected)
+        candidate_boxes += len(actual)
+        same_count += len(expected) == len(actual)
+        ious.extend(pair_ious.tolist())
+        conf_deltas.extend(np.abs(expected[pairs[:, 0], 4] - actual[pairs[:, 1], 4]).tolist())
+
+    recall = matched / reference_boxes if reference_boxes else 1.0
+    precision = matched / candidate_boxes if candidate_boxes else 1.0
+    report = {
+        'clip': args.clip,
+        'frames': len(frames),
+        'reference': dict(backend=args.reference_backend, model=args.reference_model, boxes=reference_boxes,
+                          **reference_timing),
+        'candidate': dict(backend=args.backend, model=args.model, boxes=candidate_boxes, **candidate_timing),
+        'recall': recall,
+        'precision': precision,
+        'meanIou': float(np.mean(ious)) if ious else None,
+        'meanConfDelta': float(np.mean(conf_deltas)) if conf_deltas else None,
+        'sameCountFrames': same_count / len(frames),
+        'passed': recall >= args.min_recall and precision >= args.min_precision,
+    }
+    print(json.dumps(report, indent=2))
+    return report['passed']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Export detector models and check them against the reference backend')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser('export', help='Export a .pt model for the onnx or openvino backend')
+    export_parser.add_argument('weights', help='ultralytics .pt model')
+    export_parser.add_argument('--format', choices=('onnx', 'openvino'), default='onnx')
+    export_parser.add_argument('--imgsz', default='640', help='Model input size: <size> or <height>,<width>')
+    export_parser.add_argument('--batch', type=int, default=1, help='Static batch size of the export')
+    export_parser.add_argument('--dynamic', action='store_true', help='Export with dynamic batch and input size')
+    export_parser.add_argument('--int8', action='store_true', help='Also write an int8 quantized model')
+    export_parser.add_argument('--calibration', help='Clip whose frames calibrate the int8 quantization')
+    export_parser.add_argument('--calibration-frames', type=int, default=200)
+
+    check_parser = commands.add_parser('check', help='Compare person boxes against the reference backend on a clip')
+    check_parser.add_argument('clip', help='Fixture video')
+    check_parser.add_argument('--backend', choices=BACKENDS, required=True)
+    check_parser.add_argument('--model', required=True)
+    check_parser.add_argument('--reference-backend', choices=BACKENDS, default='ultralytics')
+    check_parser.add_argument('--reference-model', default='yolov8n.pt')
+    check_parser.add_argument('--frames', type=int, default=100, help='Frames spread over the clip')
+    check_parser.add_argument('--classes', nargs='+', type=int, default=[0], help='Classes compared (default: person)')
+    check_parser.add_argument('--conf', type=float, default=0.25)
+    check_parser.add_argument('--imgsz', default=None, help='Input size: <size> or <height>,<width>')
+    check_parser.add_argument('--threads', type=int, default=None, help='Inference threads of both backends')
+    check_parser.add_argument('--min-iou', type=float, default=0.5, help='IoU for two boxes to count as the same person')
+    check_parser.add_argument('--min-recall', type=float, default=0.9, help='Share of reference boxes to find')
+    check_parser.add_argument('--min-precision', type=float, default=0.9, help='Share of boxes the reference agrees with')
+
+    for sub_parser in (export_parser, check_parser):
+        sub_parser.add_argument('--width', type=int, default=640, help='Width frames are resized to, like the service')
+        sub_parser.add_argument('--height', type=int, default=480)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.command == 'export':
+        export(args)
+    elif not check(args):
+        sys.exit(1)
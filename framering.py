@@ -0,0 +1,66 @@
+import threading
+from multiprocessing import shared_memory
+import numpy as np
+
+
+class FrameRing(object):
+    """
+    Preallocated ring of fixed-size frames in a single shared memory block.
+    Capture writes straight into a free slot (e.g. cv2.resize(..., dst=ring.frame(slot)))
+    and the later stages pass the slot index around instead of the pixels. Every
+    holder of a slot index owns one reference and gives it back with release(), and
+    a slot is handed out again only once nobody references it. Reference counts are
+    kept per process, so slots are shared between the threads of one process.
+    """
+    def __init__(self, slots=4, shape=(480, 640, 3), dtype=np.uint8):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = slots * int(np.prod(self.shape)) * self.dtype.itemsize
+        self.memory = shared_memory.SharedMemory(create=True, size=size)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=self.dtype, buffer=self.memory.buf)
+        self.refcounts = [0 for _ in range(slots)]
+        self.next_slot = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.refcounts)
+
+    @property
+    def name(self):
+        # Name of the shared memory block, for mapping the slots from another process
+        return self.memory.name
+
+    def acquire(self):
+        # Reserve a free slot for writing and return its index with one reference held
+        # by the caller, or None when every slot is still in use
+        with self.lock:
+            for offset in range(len(self.refcounts)):
+                slot = (self.next_slot + offset) % len(self.refcounts)
+                if self.refcounts[slot] == 0:
+                    self.refcounts[slot] = 1
+                    self.next_slot = (slot + 1) % len(self.refcounts)
+                    return slot
+        return None
+
+    def retain(self, slot):
+        with self.lock:
+            self.refcounts[slot] += 1
+
+    def release(self, slot):
+        with self.lock:
+            if self.refcounts[slot] <= 0:
+                raise ValueError(f"Frame slot {slot} released more often than it was acquired")
+            self.refcounts[slot] -= 1
+
+    def frame(self, slot):
+        # Writable view of a slot; valid until the last reference to the slot is released
+        return self.frames[slot]
+
+    def close(self):
+        # Unmap and free the block; views returned by frame() must not be used afterwards
+        self.frames = None
+        try:
+            self.memory.close()
+        except BufferError:
+            pass  # a view is still alive somewhere; the mapping goes away with it
+        self.memory.unlink()
@@ -0,0 +1,75 @@
+import threading
+import time
+from concurrent.futures import Future
+from metrics import NullHistogram
+
+
+class BatchInferenceScheduler(threading.Thread):
+    """
+    Runs the detector for every stream from a single thread. Frames submitted by
+    the stream workers are collected until one frame per stream is waiting (or
+    max_batch frames are), or until max_wait seconds have passed since the first
+    frame arrived, and are then sent through the detector (see detectors.py) as
+    one batch. Each worker gets its own [x1, y1, x2, y2, conf, cls] rows back for
+    its SORT tracker.
+    """
+    def __init__(self, detector, streams, max_batch=8, max_wait=0.02,
+                 batch_timer=None, batch_sizes=None):
+        super().__init__(name='inference', daemon=True)
+        self.batch_timer = batch_timer or NullHistogram()
+        self.batch_sizes = batch_sizes or NullHistogram()
+        self.detector = detector
+        self.streams = streams
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+
+        self.condition = threading.Condition()
+        self.pending = []  # (url_index, frame, future)
+
+    def submit(self, url_index, frame):
+        future = Future()
+        with self.condition:
+            self.pending.append((url_index, frame, future))
+            self.condition.notify()
+        return future
+
+    def detect(self, url_index, frame):
+        # Blocking helper used by the stream workers
+        return self.submit(url_index, frame).result()
+
+    def _batch_ready(self):
+        return len(self.pending) >= min(self.streams, self.max_batch)
+
+    def _next_batch(self):
+        with self.condition:
+            self.condition.wait_for(lambda: self.pending)
+            deadline = time.monotonic() + self.max_wait
+            while not self._batch_ready():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            batch = self.pending[:self.max_batch]
+            del self.pending[:self.max_batch]
+        return batch
+
+    def run(self):
+        while True:
+            batch = self._next_batch()
+            frames = [frame for _, frame, _ in batch]
+            started = time.perf_counter()
+            try:
+                detections = self.detector.detect_batch(frames)
+                if len(detections) != len(frames):
+                    # Every future must be resolved, or its worker would wait forever
+                    raise RuntimeError(f"Detector returned {len(detections)} results for {len(frames)} frames")
+                self.batch_timer.observe(time.perf_counter() - started)
+                self.batch_sizes.observe(len(frames))
+            except Exception as e:
+                print(f"Error while running batched inference: {e}")
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, _, future), rows in zip(batch, detections):
+                future.set_result(rows)
@@ -1,6 +1,6 @@
 from flask import Flask, Response, request, jsonify
 from flask_cors import CORS  # Import Flask-CORS
-from ultralytics import YOLO
+from detectors import load_detector
 import cv2
 import numpy as np
 from sort import Sort
@@ -19,8 +19,9 @@ CORS(app)
 # Initialize SocketIO
 socketio = SocketIO(app, cors_allowed_origins="*")
 
-# Load YOLO model
-model = YOLO('yolov8n.pt')  # Change this if you're using a different YOLO model
+# Load the detector (DETECTOR_BACKEND: ultralytics, onnx or openvino; DETECTOR_MODEL: its model file)
+detector = load_detector(os.getenv('DETECTOR_BACKEND', 'ultralytics'), os.getenv('DETECTOR_MODEL', 'yolov8n.pt'),
+                         imgsz=os.getenv('DETECTOR_IMGSZ'), threads=int(os.getenv('DETECTOR_THREADS', '0')))
 
 # Array of RTSP stream URLs
 cctv_urls = [
@@ -59,8 +60,7 @@ def generate_frames(url_index):
         frame = cv2.resize(frame, (desired_width, desired_height))
 
         # Perform object detection
-        results = model(frame, conf=0.25)
-        detections = results[0].boxes.data.cpu().numpy()
+        detections = detector(frame)
 
         # Calculate center line position (y-coordinate for imaginary line)
         line_position = frame.shape[0] // 2  # Midpoint of the frame height
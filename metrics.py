@@ -0,0 +1,173 @@
+import bisect
+
+# Default histogram buckets in seconds, from sub-millisecond tracker updates up to
+# multi-second database stalls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Per-frame stages timed for every stream
+STAGES = ('capture_wait', 'resize', 'inference', 'tracking', 'counting', 'annotate', 'encode')
+
+
+# Every series is written by a single thread (its stream worker, the inference
+# scheduler or the database writer), so plain increments are enough and nothing
+# on the frame path takes a lock. A scrape may see a histogram mid-update, which
+# is fine for monitoring.
+
+class Counter(object):
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name, labels):
+        return [(name, labels, self.value)]
+
+
+class Gauge(object):
+    def __init__(self, read=None):
+        self.value = 0
+        self.read = read  # Optional callable evaluated at scrape time
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name, labels):
+        return [(name, labels, self.read() if self.read else self.value)]
+
+
+class Histogram(object):
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, name, labels):
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            samples.append((name + '_bucket', labels + (('le', le),), cumulative))
+        samples.append((name + '_sum', labels, self.sum))
+        samples.append((name + '_count', labels, cumulative))
+        return samples
+
+
+class NullHistogram(object):
+    def observe(self, value):
+        pass
+
+
+class MetricsRegistry(object):
+    """
+    Minimal Prometheus-style registry rendered in the text exposition format by /metrics.
+    """
+    def __init__(self):
+        self.families = {}  # name -> (type, help, {labels: metric})
+
+    def _get(self, kind, name, help_text, labels, factory):
+        family = self.families.setdefault(name, (kind, help_text, {}))
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        metric = family[2].get(key)
+        if metric is None:
+            metric = family[2][key] = factory()
+        return metric
+
+    def counter(self, name, help_text, **labels):
+        return self._get('counter', name, help_text, labels, Counter)
+
+    def gauge(self, name, help_text, read=None, **labels):
+        return self._get('gauge', name, help_text, labels, lambda: Gauge(read))
+
+    def counter_from(self, name, help_text, read, **labels):
+        # Counter whose value is owned elsewhere (e.g. an attribute) and read at scrape time
+        return self._get('counter', name, help_text, labels, lambda: Gauge(read))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS, **labels):
+        return self._get('histogram', name, help_text, labels, lambda: Histogram(buckets))
+
+    def snapshot(self):
+        # Plain (kind, name, help, labels, value) rows of every series, for sending to
+        # another process; a histogram's value is (buckets, counts, sum)
+        rows = []
+        for name, (kind, help_text, metrics) in list(self.families.items()):
+            for labels, metric in list(metrics.items()):
+                if kind == 'histogram':
+                    value = (metric.buckets, list(metric.counts), metric.sum)
+                else:
+                    value = metric.samples(name, labels)[0][2]
+                rows.append((kind, name, help_text, labels, value))
+        return rows
+
+    def render(self):
+        lines = []
+        for name, (kind, help_text, metrics) in sorted(self.families.items()):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, metric in metrics.items():
+                for sample_name, sample_labels, value in metric.samples(name, labels):
+                    label_text = ','.join(f'{k}="{v}"' for k, v in sample_labels)
+                    lines.append(f'{sample_name}{{{label_text}}} {value}' if label_text else f'{sample_name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsMirror(object):
+    """
+    Copies the snapshots of a registry in another process, e.g. a worker process,
+    into this registry. Counters and histograms start from zero again when that
+    process restarts; restart() folds what it had reported into an offset, so the
+    mirrored series keep growing like counters should.
+    """
+    def __init__(self, registry):
+        self.registry = registry
+        self.offsets = {}  # (name, labels) -> value reported by earlier processes
+        self.latest = {}  # (name, labels) -> value last reported by the current process
+
+    def restart(self):
+        for key, value in self.latest.items():
+            self.offsets[key] = _add(self.offsets.get(key), value)
+        self.latest = {}
+
+    def update(self, snapshot):
+        for kind, name, help_text, labels, value in snapshot:
+            key = (name, labels)
+            self.latest[key] = value
+            if kind == 'gauge':
+                self.registry.gauge(name, help_text, **dict(labels)).set(value)
+                continue
+            total = _add(self.offsets.get(key), value)
+            if kind == 'histogram':
+                histogram = self.registry.histogram(name, help_text, buckets=total[0], **dict(labels))
+                histogram.counts, histogram.sum = list(total[1]), total[2]
+            else:
+                self.registry.counter(name, help_text, **dict(labels)).value = total
+
+
+def _add(offset, value):
+    # Sum of two counter values or (buckets, counts, sum) histogram values
+    if offset is None:
+        return value
+    if isinstance(value, tuple):
+        return (value[0], [a + b for a, b in zip(offset[1], value[1])], offset[2] + value[2])
+    return offset + value
+
+
+class StageTimers(object):
+    """
+    Histograms of the per-frame pipeline stages of one stream, as attributes named
+    after STAGES. Without a registry every stage is a no-op.
+    """
+    def __init__(self, registry=None, stream_id=None):
+        for stage in STAGES:
+            if registry is None:
+                histogram = NullHistogram()
+            else:
+                histogram = registry.histogram(
+                    'people_counter_stage_seconds', 'Time spent per frame in each pipeline stage',
+                    stream=stream_id, stage=stage)
+            setattr(self, stage, histogram)
@@ -0,0 +1,167 @@
+from flask_sqlalchemy import SQLAlchemy
+from collections import Counter
+from datetime import datetime, timedelta, time as dt_time
+
+db = SQLAlchemy()
+
+# Granularities maintained in visitor_count_rollup
+ROLLUP_BUCKETS = ('minute', 'hour', 'day')
+
+# Model for storing visitor counts with specific time of detection
+class VisitorCount(db.Model):
+    __tablename__ = 'visitor_count'
+    __table_args__ = (
+        # Serves the latest-row-per-stream lookups and keyset pagination by (date, id)
+        db.Index('ix_visitor_count_stream_date_id', 'stream_id', 'date', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, nullable=False)              # Store date in yyyy-mm-dd format
+    stream_id = db.Column(db.Integer, nullable=False)
+    time = db.Column(db.Time, nullable=False)               # Store exact time of entry in hh:mm:ss format
+    accumulation_count_per_day = db.Column(db.Integer, nullable=False, default=0)  # Daily cumulative count
+    realtime_count = db.Column(db.Integer, nullable=False)  # Count at the exact time of detection
+
+    def __init__(self, date, stream_id, time, accumulation_count_per_day, realtime_count):
+        self.date = date
+        self.stream_id = stream_id
+        self.time = time
+        self.accumulation_count_per_day = accumulation_count_per_day
+        self.realtime_count = realtime_count
+
+# Insert a batch of detections in a single statement and add them to the rollups.
+# Each entry is (stream_id, detected_at, accumulation_count_per_day); the caller commits
+def insert_visitor_counts(entries):
+    rows = [
+        {
+            'date': detected_at.date(),
+            'stream_id': stream_id,
+            'time': dt_time(detected_at.hour, detected_at.minute, detected_at.second),  # Exact time in hh:mm:ss
+            'accumulation_count_per_day': accumulation,
+            'realtime_count': 1,
+        }
+        for stream_id, detected_at, accumulation in entries
+    ]
+    db.session.execute(VisitorCount.__table__.insert(), rows)
+    # Keep the minute/hour/day rollups in step with the raw rows
+    apply_rollups((stream_id, detected_at) for stream_id, detected_at, _ in entries)
+    return rows
+
+# Latest accumulation_count_per_day of every stream on a date, as {stream_id: count},
+# found with one grouped query instead of one query per stream
+def latest_accumulations(date):
+    latest = db.session.query(db.func.max(VisitorCount.id).label('id')) \
+        .filter(VisitorCount.date == date) \
+        .group_by(VisitorCount.stream_id) \
+        .subquery()
+    rows = db.session.query(VisitorCount.stream_id, VisitorCount.accumulation_count_per_day) \
+        .join(latest, VisitorCount.id == latest.c.id)
+    return {stream_id: count for stream_id, count in rows}
+
+# Fetch one page of raw rows for keyset pagination, starting after the (date, id) key `after`.
+# With a stream_id the key order is (date, id), which walks ix_visitor_count_stream_date_id;
+# without one, pages follow the primary key
+def visitor_count_page(limit, stream_id=None, after=None, start_date=None, end_date=None):
+    query = VisitorCount.query
+    if start_date is not None:
+        query = query.filter(VisitorCount.date >= start_date)
+    if end_date is not None:
+        query = query.filter(VisitorCount.date <= end_date)
+
+    if stream_id is not None:
+        query = query.filter(VisitorCount.stream_id == stream_id)
+        if after is not None:
+            query = query.filter(db.tuple_(VisitorCount.date, VisitorCount.id) > db.tuple_(*after))
+        query = query.order_by(VisitorCount.date, VisitorCount.id)
+    else:
+        if after is not None:
+            query = query.filter(VisitorCount.id > after[1])
+        query = query.order_by(VisitorCount.id)
+    return query.limit(limit).all()
+
+# Model for pre-aggregated visitor counts per stream and time bucket
+class VisitorCountRollup(db.Model):
+    __tablename__ = 'visitor_count_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('stream_id', 'bucket', 'bucket_start', name='uq_visitor_count_rollup_bucket'),
+        db.Index('ix_visitor_count_rollup_bucket_start', 'bucket', 'bucket_start'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    stream_id = db.Column(db.Integer, nullable=False)
+    bucket = db.Column(db.String(6), nullable=False)        # One of ROLLUP_BUCKETS
+    bucket_start = db.Column(db.DateTime, nullable=False)   # Start of the minute/hour/day
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+# Create any index declared on the models that an existing database is missing,
+# since db.create_all only creates indexes together with new tables
+def create_missing_indexes():
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+# Truncate a timestamp to the start of its bucket
+def bucket_start(timestamp, bucket):
+    if bucket == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if bucket == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return datetime.combine(timestamp.date(), dt_time(0, 0, 0))
+
+# Add a batch of (stream_id, detected_at) crossings to every rollup bucket.
+# Must run in the same session as the raw inserts so both commit together; it relies on
+# being the only writer, which the write-behind queue guarantees
+def apply_rollups(crossings):
+    increments = Counter(
+        (stream_id, bucket, bucket_start(detected_at, bucket))
+        for stream_id, detected_at in crossings
+        for bucket in ROLLUP_BUCKETS
+    )
+    table = VisitorCountRollup.__table__
+    for (stream_id, bucket, start), count in increments.items():
+        result = db.session.execute(
+            table.update()
+            .where(table.c.stream_id == stream_id, table.c.bucket == bucket, table.c.bucket_start == start)
+            .values(count=table.c.count + count)
+        )
+        if result.rowcount == 0:
+            db.session.execute(table.insert().values(stream_id=stream_id, bucket=bucket, bucket_start=start, count=count))
+
+# Rebuild the rollups of every (stream, day) whose day bucket does not add up to the
+# crossings in its raw rows, e.g. days recorded before the rollups were introduced.
+# Crossings are summed per second with one GROUP BY per stale day, so running it again
+# finds nothing to do. Must run before the write-behind writer starts; the caller commits.
+# Returns the number of days rebuilt
+def backfill_rollups():
+    crossings = db.func.sum(VisitorCount.realtime_count)
+    raw_days = db.session.query(VisitorCount.stream_id, VisitorCount.date, crossings) \
+        .group_by(VisitorCount.stream_id, VisitorCount.date)
+    rolled_days = {
+        (stream_id, start.date()): count
+        for stream_id, start, count in db.session.query(
+            VisitorCountRollup.stream_id, VisitorCountRollup.bucket_start, VisitorCountRollup.count
+        ).filter(VisitorCountRollup.bucket == 'day')
+    }
+    stale = [(stream_id, date) for stream_id, date, total in raw_days
+             if rolled_days.get((stream_id, date), 0) != (total or 0)]
+
+    table = VisitorCountRollup.__table__
+    for stream_id, date in stale:
+        day = datetime.combine(date, dt_time(0, 0, 0))
+        db.session.execute(table.delete().where(
+            table.c.stream_id == stream_id,
+            table.c.bucket_start >= day,
+            table.c.bucket_start < day + timedelta(days=1),
+        ))
+        seconds = db.session.query(VisitorCount.time, crossings) \
+            .filter(VisitorCount.stream_id == stream_id, VisitorCount.date == date) \
+            .group_by(VisitorCount.time)
+        counts = Counter()
+        for time, count in seconds:
+            for bucket in ROLLUP_BUCKETS:
+                counts[bucket, bucket_start(datetime.combine(date, time), bucket)] += count or 0
+        rows = [
+            {'stream_id': stream_id, 'bucket': bucket, 'bucket_start': start, 'count': count}
+            for (bucket, start), count in counts.items() if count
+        ]
+        if rows:
+            db.session.execute(table.insert(), rows)
+    return len(stale)
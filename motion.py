@@ -0,0 +1,71 @@
+import cv2
+import numpy as np
+from config import stream_setting
+
+
+class MotionGate(object):
+    """
+    Cheap pre-filter that decides whether a frame needs to go through the detector.
+    The counting region is downscaled, converted to grayscale and compared with a
+    running-average background; the detector runs while enough pixels differ, for
+    hold_frames frames after motion stops, and once every idle_interval frames
+    while the scene is idle (0 disables the idle probe).
+    """
+    def __init__(self, pixel_threshold=25, min_area=0.002, scale=0.25, hold_frames=15,
+                 idle_interval=25, learning_rate=0.05):
+        self.pixel_threshold = pixel_threshold
+        self.min_area = min_area
+        self.scale = scale
+        self.hold_frames = hold_frames
+        self.idle_interval = idle_interval
+        self.learning_rate = learning_rate
+
+        self.background = None
+        self.hold = 0
+        self.since_detect = 0
+        self.frames = 0
+        self.skipped = 0
+
+    @property
+    def skip_ratio(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def should_detect(self, frame, region):
+        # region is (x0, y0, x1, y1) in frame coordinates
+        x0, y0, x1, y1 = region
+        small = cv2.resize(frame[y0:y1, x0:x1], None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0).astype(np.float32)
+
+        self.frames += 1
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray
+            moving = True
+        else:
+            diff = cv2.absdiff(gray, self.background)
+            moving = np.count_nonzero(diff > self.pixel_threshold) >= self.min_area * diff.size
+            cv2.accumulateWeighted(gray, self.background, self.learning_rate)
+
+        if moving:
+            self.hold = self.hold_frames
+        elif self.hold > 0:
+            self.hold -= 1
+
+        detect = moving or self.hold > 0 or (self.idle_interval > 0 and self.since_detect + 1 >= self.idle_interval)
+        if detect:
+            self.since_detect = 0
+        else:
+            self.since_detect += 1
+            self.skipped += 1
+        return detect
+
+    @classmethod
+    def from_env(cls, stream_id):
+        # Build the gate for a stream from MOTION_* settings, or None if MOTION_GATE is off
+        if not stream_setting('MOTION_GATE', stream_id, True, bool):
+            return None
+        return cls(
+            pixel_threshold=stream_setting('MOTION_PIXEL_THRESHOLD', stream_id, 25.0),
+            min_area=stream_setting('MOTION_MIN_AREA', stream_id, 0.002),
+            hold_frames=stream_setting('MOTION_HOLD_FRAMES', stream_id, 15, int),
+            idle_interval=stream_setting('MOTION_IDLE_INTERVAL', stream_id, 25, int),
+        )
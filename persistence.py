@@ -0,0 +1,94 @@
+import queue
+import threading
+import time
+from metrics import NullHistogram
+
+
+class WriteBehindWriter(threading.Thread):
+    """
+    Background writer that takes events off a bounded queue and hands them to
+    flush() in batches, either every max_batch events or every flush_interval
+    seconds, whichever comes first. Producers only pay for a queue put, which
+    never blocks: events that find the queue full are dropped and counted in
+    rejected_events. A batch whose flush() raises is retried up to max_retries
+    times with exponential backoff before its events are counted in
+    dropped_events.
+    """
+    _STOP = object()
+
+    def __init__(self, flush, max_batch=100, flush_interval=0.5, max_queue=10000, flush_timer=None,
+                 max_retries=5, retry_backoff=0.5, max_retry_backoff=10.0):
+        super().__init__(name='write-behind', daemon=True)
+        self.flush = flush
+        self.flush_timer = flush_timer or NullHistogram()
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = flush_interval
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stopping = threading.Event()  # cuts retry backoff short on shutdown
+        self.rejected_events = 0
+        self.dropped_events = 0
+
+    def submit(self, event):
+        # Returns False, without waiting, if the database has fallen max_queue events behind
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            if not self.rejected_events:
+                print(f"Error: Write queue full ({self.queue.maxsize} events), dropping events")
+            self.rejected_events += 1
+            return False
+        return True
+
+    def stop(self, timeout=5.0):
+        # Flush whatever is still queued and wait for the writer to finish
+        if self.is_alive():
+            self.stopping.set()
+            try:
+                self.queue.put(self._STOP, timeout=timeout)
+            except queue.Full:
+                return
+            self.join(timeout)
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            event = self.queue.get()
+            if event is self._STOP:
+                break
+            batch = [event]
+
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    event = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if event is self._STOP:
+                    stopping = True
+                    break
+                batch.append(event)
+
+            self._flush(batch)
+
+    def _flush(self, batch):
+        backoff = self.retry_backoff
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                self.flush(batch)
+                return
+            except Exception as e:
+                print(f"Error while flushing {len(batch)} events (attempt {attempt + 1}): {e}")
+            finally:
+                self.flush_timer.observe(time.perf_counter() - started)
+            if attempt == self.max_retries or self.stopping.wait(backoff):
+                break
+            backoff = min(backoff * 2, self.max_retry_backoff)
+        self.dropped_events += len(batch)
+        print(f"Error: Dropped {len(batch)} events after {attempt + 1} failed flushes")
@@ -0,0 +1,240 @@
+import threading
+import time
+import cv2
+import numpy as np
+from capture import FrameGrabber
+from config import stream_setting
+from counting import LineCrossingCounter
+from metrics import StageTimers
+from motion import MotionGate
+from roi import RegionOfInterest
+from sort import Sort
+
+
+def to_sort_input(detections, frame_shape, classes=(0,), min_conf=0.0):
+    """
+    Turns detector rows [x1, y1, x2, y2, conf(, cls)] into the (N, 5) SORT input:
+    rows of another class (when a class column is present) or below min_conf are
+    dropped, boxes are clipped to the frame, and boxes left without area are
+    dropped, all with array operations.
+    """
+    detections = np.asarray(detections, dtype=float)
+    if detections.ndim != 2 or detections.shape[1] < 5 or not len(detections):
+        return np.empty((0, 5))
+
+    keep = detections[:, 4] >= min_conf
+    if detections.shape[1] >= 6 and classes is not None:
+        keep &= np.isin(detections[:, 5].astype(int), classes)
+    detections = detections[keep]
+
+    sort_input = np.empty((len(detections), 5))
+    height, width = frame_shape[:2]
+    np.clip(detections[:, :4], 0, (width, height, width, height), out=sort_input[:, :4])
+    sort_input[:, 4] = detections[:, 4]
+    return sort_input[(sort_input[:, 2] > sort_input[:, 0]) & (sort_input[:, 3] > sort_input[:, 1])]
+
+
+class CountingPipeline(object):
+    """
+    Detection, tracking and line counting for a single stream, independent of
+    where its frames come from. StreamWorker runs it on live cameras and
+    replay.py runs it on recorded files.
+    """
+    def __init__(self, detect, tracker, counter, motion_gate=None, motion_band=80, roi=None,
+                 timers=None, classes=(0,), min_conf=0.0, annotate='auto'):
+        self.detect = detect
+        self.tracker = tracker
+        self.counter = counter
+        self.motion_gate = motion_gate
+        self.motion_band = motion_band
+        self.roi = roi
+        self.timers = timers or StageTimers()
+        self.classes = classes
+        self.min_conf = min_conf
+        # 'auto' draws only on frames that are about to be sent to a preview viewer,
+        # 'always' on every frame, 'never' leaves the preview unannotated
+        self.annotate_mode = annotate
+        self.lock = threading.Lock()  # held while tracker and counter are updated
+
+    @classmethod
+    def from_env(cls, stream_id, detect, frame_size, timers=None):
+        # Build the pipeline of a stream from its COUNT_LINE, ROI, DETECT_*, ANNOTATE and MOTION_* settings
+        counter = LineCrossingCounter.parse(stream_setting('COUNT_LINE', stream_id, '', str), frame_size,
+                                            stream_setting('COUNT_LINE_MARGIN', stream_id, 10.0))
+        return cls(
+            detect, Sort(), counter,
+            motion_gate=MotionGate.from_env(stream_id),
+            motion_band=stream_setting('MOTION_BAND', stream_id, 80, int),
+            roi=RegionOfInterest.parse(stream_setting('ROI', stream_id, '', str),
+                                       frame_size, (counter.start, counter.end)),
+            timers=timers,
+            classes=[int(c) for c in stream_setting('DETECT_CLASSES', stream_id, '0', str).split(',')],
+            min_conf=stream_setting('DETECT_MIN_CONF', stream_id, 0.0),
+            annotate=stream_setting('ANNOTATE', stream_id, 'auto', str))
+
+    def motion_region(self, frame):
+        # Bounding box of the counting line, grown by motion_band px, watched by the motion gate
+        (sx, sy), (ex, ey) = self.counter.start, self.counter.end
+        x0 = max(0, int(min(sx, ex)) - self.motion_band)
+        y0 = max(0, int(min(sy, ey)) - self.motion_band)
+        x1 = min(frame.shape[1], int(max(sx, ex)) + self.motion_band)
+        y1 = min(frame.shape[0], int(max(sy, ey)) + self.motion_band)
+        return x0, y0, x1, y1
+
+    def process(self, frame, on_crossing=None):
+        # Returns (tracked_objects, crossings), where crossings is a list of (track_id, direction, first)
+        return self.track(self.detect_people(frame), on_crossing)
+
+    def detect_people(self, frame):
+        # Detection half of process(): SORT input rows [x1, y1, x2, y2, score] for the frame,
+        # none when the motion gate skips the detector
+        sort_input = np.empty((0, 5))
+        if self.motion_gate is None or self.motion_gate.should_detect(frame, self.motion_region(frame)):
+            # Perform object detection on the region of interest only, then map the
+            # boxes.data rows back into full-frame coordinates
+            started = time.perf_counter()
+            if self.roi is None:
+                detections = self.detect(frame)
+            else:
+                detections = self.roi.to_frame(self.detect(self.roi.crop(frame)))
+            self.timers.inference.observe(time.perf_counter() - started)
+            sort_input = to_sort_input(detections, frame.shape, self.classes, self.min_conf)
+        return sort_input
+
+    def track(self, sort_input, on_crossing=None):
+        # Tracking and counting half of process(), for SORT input rows [x1, y1, x2, y2, score].
+        # on_crossing(track_id, direction, first) is called for every crossing before the
+        # lock is released, so state() never sees the counter ahead of what was recorded
+        started = time.perf_counter()
+        with self.lock:
+            # The tracker is updated on every frame, with no detections when the detector
+            # was skipped or found nobody, so that tracks age out correctly
+            tracked_objects = self.tracker.update(sort_input)
+            tracked = time.perf_counter()
+            self.timers.tracking.observe(tracked - started)
+
+            # Count tracks whose centre crossed the line since their previous position
+            crossings = self.counter.update(tracked_objects, self.tracker.active_ids())
+            self.timers.counting.observe(time.perf_counter() - tracked)
+            if on_crossing is not None:
+                for crossing in crossings:
+                    on_crossing(*crossing)
+        return tracked_objects, crossings
+
+    def state(self, read=None):
+        # Tracker and counter state between two frames, for checkpoints. read() is called
+        # under the same lock and its dict merged in, for state recorded through on_crossing
+        with self.lock:
+            state = {'tracker_' + key: value for key, value in self.tracker.state().items()}
+            state.update(('counter_' + key, value) for key, value in self.counter.state().items())
+            if read is not None:
+                state.update(read())
+        return state
+
+    def load_state(self, state):
+        with self.lock:
+            self.tracker.load_state({key[len('tracker_'):]: value for key, value in state.items()
+                                     if key.startswith('tracker_')})
+            self.counter.load_state({key[len('counter_'):]: value for key, value in state.items()
+                                     if key.startswith('counter_')})
+
+    def should_annotate(self, broadcaster):
+        if self.annotate_mode == 'auto':
+            return broadcaster.wants_frame()
+        return self.annotate_mode == 'always'
+
+    def annotate(self, frame, tracked_objects, count):
+        started = time.perf_counter()
+        for x1, y1, x2, y2 in np.asarray(tracked_objects)[:, :4].astype(int).tolist():
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+
+        if self.roi is not None:
+            self.roi.draw(frame)
+        start = tuple(int(v) for v in self.counter.start)
+        end = tuple(int(v) for v in self.counter.end)
+        cv2.line(frame, start, end, (255, 0, 0), 2)
+        cv2.putText(frame, f'Count: {count}', (10, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        self.timers.annotate.observe(time.perf_counter() - started)
+
+
+class StreamWorker(threading.Thread):
+    """
+    Long-lived worker that owns capture (through a FrameGrabber), detection,
+    tracking and counting for a single camera. Annotated frames are handed to the
+    stream's broadcaster, so the cost of a stream no longer depends on how many
+    people are watching it.
+    """
+    def __init__(self, url_index, url, pipeline, on_count, get_count, broadcaster,
+                 frame_size=(640, 480)):
+        super().__init__(name=f'stream-{url_index + 1}', daemon=True)
+        self.url_index = url_index
+        self.url = url
+        self.pipeline = pipeline
+        self.on_count = on_count
+        self.get_count = get_count
+        self.broadcaster = broadcaster
+        self.frame_size = frame_size
+        self.grabber = FrameGrabber.from_env(url_index + 1, url, name=f'capture-{url_index + 1}',
+                                             frame_size=frame_size, resize_timer=pipeline.timers.resize)
+
+    def stats(self):
+        # Health of the stream as reported by /cctv_links and /metrics
+        gate = self.pipeline.motion_gate
+        return {
+            'connected': self.grabber.connected,
+            'droppedFrames': self.grabber.dropped_frames,
+            'reconnects': self.grabber.reconnects,
+            'activeTracks': len(self.pipeline.tracker.active_ids()),
+            'detectorSkipped': gate.skipped if gate else 0,
+            'detectorSkipRatio': gate.skip_ratio if gate else 0.0,
+        }
+
+    def run(self):
+        # Capture runs on its own thread; the worker only ever sees the newest frame,
+        # already resized into a ring slot, and keeps its tracker and line counter
+        # across reconnects
+        self.grabber.start()
+        frame_id = 0
+
+        try:
+            timers = self.pipeline.timers
+            while True:
+                started = time.perf_counter()
+                frame_id, slot = self.grabber.read(frame_id)
+                if slot is None:
+                    if self.grabber.stopped:
+                        break
+                    continue
+                timers.capture_wait.observe(time.perf_counter() - started)
+
+                # The slot is annotated in place and encoded from there; nobody else reads it
+                try:
+                    self._process(self.grabber.frame(slot))
+                except Exception as e:
+                    # Keep counting on the next frame rather than losing the camera for good
+                    print(f"Error while processing frame of stream {self.url_index + 1}: {e}")
+                finally:
+                    self.grabber.release(slot)
+        finally:
+            self.grabber.close()
+            self.broadcaster.close()
+
+    def _count(self, track_id, direction, first):
+        try:
+            self.on_count(self.url_index, direction, first)
+        except Exception as e:
+            print(f"Error while recording crossing of stream {self.url_index + 1}: {e}")
+
+    def _process(self, frame):
+        try:
+            sort_input = self.pipeline.detect_people(frame)
+        except Exception as e:
+            # A failed detector batch costs this frame only; the tracker still gets an
+            # empty update so tracks age out as they would with nobody in view
+            print(f"Error while detecting on stream {self.url_index + 1}: {e}")
+            sort_input = np.empty((0, 5))
+        tracked_objects, _ = self.pipeline.track(sort_input, self._count)
+
+        if self.pipeline.should_annotate(self.broadcaster):
+            self.pipeline.annotate(frame, tracked_objects, self.get_count(self.url_index))
+        self.broadcaster.publish(frame)
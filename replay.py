@@ -0,0 +1,178 @@
+"""
+Headless replay of recorded video through the counting pipeline.
+
+Runs detection, SORT and line counting over local video files as fast as the CPU
+allows (no JPEG encoding, no Socket.IO, no database) and writes one CSV per file
+with a row per line crossing. Timestamps come from the frame index and the file's
+frame rate, offset by --start when given, so NVR footage can be used to back-fill
+counts after an outage. Files can be spread over a process pool, one file per
+worker.
+
+    python replay.py footage/cam1.mp4 footage/cam2.mp4 --workers 2 --start 2026-10-16T08:00:00
+"""
+import argparse
+import csv
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import cv2
+import numpy as np
+
+from capture import FfmpegReader, OpenCvReader
+from counting import LineCrossingCounter
+from detectors import BACKENDS, load_detector
+from motion import MotionGate
+from pipeline import CountingPipeline
+from roi import RegionOfInterest
+from sort import Sort
+
+# Detector of the current process, loaded on first use so each pool worker has its own
+_detector = None
+
+
+def process_detector(args):
+    global _detector
+    if _detector is None:
+        _detector = load_detector(args.backend, args.weights, conf=args.conf, imgsz=args.imgsz, threads=args.threads)
+    return _detector
+
+
+def open_reader(path, args, frame_size):
+    # ffmpeg decodes straight at the replay size when available; OpenCV decodes at the
+    # file's resolution and resizes
+    if args.decoder in ('auto', 'ffmpeg') and shutil.which(args.ffmpeg):
+        reader = FfmpegReader(path, frame_size, args.decode_every, args.ffmpeg)
+        if reader.isOpened():
+            return reader
+        reader.release()
+    if args.decoder == 'ffmpeg':
+        raise IOError(f"ffmpeg could not decode {path}")
+    reader = OpenCvReader(path, frame_size, args.decode_every)
+    if not reader.isOpened():
+        raise IOError(f"Could not open video file: {path}")
+    return reader
+
+
+def output_names(paths):
+    # CSV name of every file: its base name, or for files sharing a base name, their
+    # paths below the directory they have in common (a/cam.mp4, b/cam.mp4 -> a_cam.mp4,
+    # b_cam.mp4). Raises ValueError when a file is given twice
+    names = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    for name in set(names):
+        same = [i for i, other in enumerate(names) if other == name]
+        if len(same) > 1:
+            full_paths = [os.path.abspath(paths[i]) for i in same]
+            common = os.path.commonpath(full_paths)
+            for i, full_path in zip(same, full_paths):
+                names[i] = os.path.relpath(full_path, common).replace(os.sep, '_')
+    duplicates = sorted(path for path, name in zip(paths, names) if names.count(name) > 1)
+    if duplicates:
+        raise ValueError(f"Files would overwrite each other's output: {', '.join(duplicates)}")
+    return names
+
+
+def replay_file(path, name, args):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video file: {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or args.fps
+    cap.release()
+
+    frame_size = (args.width, args.height)
+    reader = open_reader(path, args, frame_size)
+    frame = np.empty((args.height, args.width, 3), dtype=np.uint8)
+    counter = LineCrossingCounter.parse(args.line, frame_size, args.line_margin)
+    pipeline = CountingPipeline(
+        process_detector(args),
+        Sort(max_age=args.max_age, min_hits=args.min_hits, iou_threshold=args.iou_threshold),
+        counter,
+        motion_gate=MotionGate() if args.motion_gate else None,
+        roi=RegionOfInterest.parse(args.roi, frame_size, (counter.start, counter.end)),
+    )
+    start = datetime.fromisoformat(args.start) if args.start else None
+
+    out_path = os.path.join(args.output_dir, f'{name}.csv')
+    frames = 0
+    started = time.perf_counter()
+    with open(out_path, 'w', newline='') as out_file:
+        writer = csv.writer(out_file)
+        writer.writerow(['frame', 'seconds', 'timestamp', 'track_id', 'direction'])
+        while reader.read(frame):
+            _, crossings = pipeline.process(frame)
+            # Frame numbers and timestamps stay those of the file when only every Nth frame is decoded
+            index = frames * args.decode_every
+            seconds = index / fps
+            for track_id, direction, _ in crossings:
+                timestamp = (start + timedelta(seconds=seconds)).isoformat() if start else ''
+                writer.writerow([index, f'{seconds:.3f}', timestamp, track_id, direction])
+            frames += 1
+    reader.release()
+
+    elapsed = time.perf_counter() - started
+    return {
+        'file': path,
+        'output': out_path,
+        'frames': frames,
+        'seconds': elapsed,
+        'in': counter.count_in,
+        'out': counter.count_out,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Replay recorded video through the counting pipeline')
+    parser.add_argument('files', nargs='+', help='Video files to process')
+    parser.add_argument('--output-dir', default='replay_output', help='Directory for the per-file CSVs')
+    parser.add_argument('--workers', type=int, default=1, help='Processes to use, one file per worker')
+    parser.add_argument('--start', help='Wall-clock time of the first frame (ISO format) for the timestamp column')
+    parser.add_argument('--fps', type=float, default=25.0, help='Frame rate to assume when the file does not report one')
+    parser.add_argument('--backend', choices=BACKENDS, default='ultralytics', help='Detector runtime')
+    parser.add_argument('--weights', default='yolov8n.pt', help='Model for the backend: .pt, .onnx or OpenVINO .xml')
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--imgsz', default='', help='Detector input size: <size> or <height>,<width>')
+    parser.add_argument('--threads', type=int, default=0, help='Inference threads per process (default: runtime default)')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--decoder', choices=('auto', 'ffmpeg', 'opencv'), default='auto',
+                        help='ffmpeg decodes at the replay size; auto uses it when installed')
+    parser.add_argument('--decode-every', type=int, default=1, help='Decode only every Nth frame')
+    parser.add_argument('--ffmpeg', default='ffmpeg', help='ffmpeg executable')
+    parser.add_argument('--line', default='', help='Counting line x1,y1,x2,y2 (default: across the middle)')
+    parser.add_argument('--line-margin', type=float, default=10.0,
+                        help='Distance in px from the line within which a centre counts as on it')
+    parser.add_argument('--roi', default='', help='Region of interest: band:<h>, rect:x0,y0,x1,y1 or poly:x,y;...')
+    parser.add_argument('--motion-gate', action='store_true', help='Skip the detector on idle frames')
+    parser.add_argument('--max_age', type=int, default=1)
+    parser.add_argument('--min_hits', type=int, default=3)
+    parser.add_argument('--iou_threshold', type=float, default=0.3)
+    args = parser.parse_args()
+    try:
+        args.names = output_names(args.files)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(replay_file, args.files, args.names, [args] * len(args.files)))
+    else:
+        results = [replay_file(path, name, args) for path, name in zip(args.files, args.names)]
+
+    total_frames = 0
+    for result in results:
+        total_frames += result['frames']
+        print("%s: %d frames in %.1fs (%.1f FPS), in: %d, out: %d -> %s" % (
+            result['file'], result['frames'], result['seconds'],
+            result['frames'] / result['seconds'] if result['seconds'] else 0.0,
+            result['in'], result['out'], result['output']))
+    elapsed = time.perf_counter() - started
+    print("Total: %d frames in %.1fs or %.1f FPS" % (total_frames, elapsed, total_frames / elapsed if elapsed else 0.0))
@@ -0,0 +1,62 @@
+import cv2
+import numpy as np
+
+
+class RegionOfInterest(object):
+    """
+    Part of the frame that is sent to the detector. The crop is the bounding
+    rectangle of the region; for polygons, pixels outside the polygon are blanked.
+    Detections on the crop are mapped back into full-frame coordinates.
+    """
+    def __init__(self, bounds, polygon=None):
+        self.x0, self.y0, self.x1, self.y1 = [int(v) for v in bounds]
+        self.mask = None
+        if polygon is not None:
+            points = np.array(polygon, dtype=np.int32) - [self.x0, self.y0]
+            self.mask = np.zeros((self.y1 - self.y0, self.x1 - self.x0), dtype=np.uint8)
+            cv2.fillPoly(self.mask, [points], 255)
+
+    def crop(self, frame):
+        crop = frame[self.y0:self.y1, self.x0:self.x1]
+        if self.mask is not None:
+            crop = cv2.bitwise_and(crop, crop, mask=self.mask)
+        return crop
+
+    def to_frame(self, detections):
+        # Shift [x1, y1, x2, y2, ...] rows from crop to frame coordinates
+        detections = np.array(detections, dtype=float, copy=True)
+        if len(detections):
+            detections[:, [0, 2]] += self.x0
+            detections[:, [1, 3]] += self.y0
+        return detections
+
+    def draw(self, frame):
+        cv2.rectangle(frame, (self.x0, self.y0), (self.x1 - 1, self.y1 - 1), (128, 128, 128), 1)
+
+    @classmethod
+    def parse(cls, spec, frame_size, line):
+        # line is the counting line as ((x1, y1), (x2, y2)); spec is one of:
+        #   band:<h>                 rows within h px of the counting line, across the full width
+        #   rect:x0,y0,x1,y1         a rectangle
+        #   poly:x,y;x,y;x,y[;...]   a polygon
+        # An empty spec means the whole frame (returns None).
+        if not spec:
+            return None
+        width, height = frame_size
+        kind, _, value = spec.partition(':')
+        kind = kind.strip().lower()
+
+        if kind == 'band':
+            half = int(value)
+            top = int(min(line[0][1], line[1][1])) - half
+            bottom = int(max(line[0][1], line[1][1])) + half
+            return cls((0, max(0, top), width, min(height, bottom)))
+        if kind == 'rect':
+            x0, y0, x1, y1 = [int(v) for v in value.split(',')]
+            return cls((max(0, x0), max(0, y0), min(width, x1), min(height, y1)))
+        if kind == 'poly':
+            points = [[int(v) for v in point.split(',')] for point in value.split(';')]
+            xs = [min(max(x, 0), width) for x, _ in points]
+            ys = [min(max(y, 0), height) for _, y in points]
+            return cls((min(xs), min(ys), max(xs), max(ys)), polygon=list(zip(xs, ys)))
+        raise ValueError(f"Invalid ROI spec {spec!r}, expected band:, rect: or poly:")
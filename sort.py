@@ -19,29 +19,47 @@ from __future__ import print_function
 
 import os
 import numpy as np
-import matplotlib
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from skimage import io
 
 import glob
 import time
 import argparse
-from filterpy.kalman import KalmanFilter
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+# The tracker itself only needs numpy (plus lap or scipy for the assignment);
+# matplotlib/skimage are imported only by the demo below when run with --display
 
 np.random.seed(0)
 
 
-def linear_assignment(cost_matrix):
+def _resolve_linear_assignment():
+  """
+  Returns the assignment solver: lap if it is installed, otherwise scipy.
+  """
   try:
     import lap
-    _, x, y = lap.lapjv(cost_matrix, extend_cost=True)
-    return np.array([[y[i],i] for i in x if i >= 0]) #
   except ImportError:
     from scipy.optimize import linear_sum_assignment
-    x, y = linear_sum_assignment(cost_matrix)
-    return np.array(list(zip(x, y)))
+
+    def solve(cost_matrix):
+      x, y = linear_sum_assignment(cost_matrix)
+      return np.array(list(zip(x, y)))
+    return solve
+
+  def solve(cost_matrix):
+    _, x, y = lap.lapjv(cost_matrix, extend_cost=True)
+    return np.array([[y[i],i] for i in x if i >= 0]) #
+  return solve
+
+
+_linear_assignment = None
+
+def linear_assignment(cost_matrix):
+  # The backend is resolved on the first call instead of at import time, and reused afterwards
+  global _linear_assignment
+  if _linear_assignment is None:
+    _linear_assignment = _resolve_linear_assignment()
+  return _linear_assignment(cost_matrix)
 
 
 def iou_batch(bb_test, bb_gt):
@@ -91,75 +109,49 @@ def convert_x_to_bbox(x,score=None):
     return np.array([x[0]-w/2.,x[1]-h/2.,x[0]+w/2.,x[1]+h/2.,score]).reshape((1,5))
 
 
-class KalmanBoxTracker(object):
+def convert_bboxes_to_z(bboxes):
   """
-  This class represents the internal state of individual tracked objects observed as bbox.
+  Vectorised convert_bbox_to_z: takes an (N,4+) array of [x1,y1,x2,y2] boxes and
+    returns an (N,4) array of [x,y,s,r] rows
   """
-  count = 0
-  def __init__(self,bbox):
-    """
-    Initialises a tracker using initial bounding box.
-    """
-    #define constant velocity model
-    self.kf = KalmanFilter(dim_x=7, dim_z=4) 
-    self.kf.F = np.array([[1,0,0,0,1,0,0],[0,1,0,0,0,1,0],[0,0,1,0,0,0,1],[0,0,0,1,0,0,0],  [0,0,0,0,1,0,0],[0,0,0,0,0,1,0],[0,0,0,0,0,0,1]])
-    self.kf.H = np.array([[1,0,0,0,0,0,0],[0,1,0,0,0,0,0],[0,0,1,0,0,0,0],[0,0,0,1,0,0,0]])
-
-    self.kf.R[2:,2:] *= 10.
-    self.kf.P[4:,4:] *= 1000. #give high uncertainty to the unobservable initial velocities
-    self.kf.P *= 10.
-    self.kf.Q[-1,-1] *= 0.01
-    self.kf.Q[4:,4:] *= 0.01
-
-    self.kf.x[:4] = convert_bbox_to_z(bbox)
-    self.time_since_update = 0
-    self.id = KalmanBoxTracker.count
-    KalmanBoxTracker.count += 1
-    self.history = []
-    self.hits = 0
-    self.hit_streak = 0
-    self.age = 0
-
-  def update(self,bbox):
-    """
-    Updates the state vector with observed bbox.
-    """
-    self.time_since_update = 0
-    self.history = []
-    self.hits += 1
-    self.hit_streak += 1
-    self.kf.update(convert_bbox_to_z(bbox))
+  w = bboxes[:, 2] - bboxes[:, 0]
+  h = bboxes[:, 3] - bboxes[:, 1]
+  x = bboxes[:, 0] + w/2.
+  y = bboxes[:, 1] + h/2.
+  s = w * h    #scale is just area
+  r = w / h.astype(float)
+  return np.stack((x, y, s, r), axis=1)
 
-  def predict(self):
-    """
-    Advances the state vector and returns the predicted bounding box estimate.
-    """
-    if((self.kf.x[6]+self.kf.x[2])<=0):
-      self.kf.x[6] *= 0.0
-    self.kf.predict()
-    self.age += 1
-    if(self.time_since_update>0):
-      self.hit_streak = 0
-    self.time_since_update += 1
-    self.history.append(convert_x_to_bbox(self.kf.x))
-    return self.history[-1]
 
-  def get_state(self):
-    """
-    Returns the current bounding box estimate.
-    """
-    return convert_x_to_bbox(self.kf.x)
+def convert_x_to_bboxes(x):
+  """
+  Vectorised convert_x_to_bbox: takes an (N,4+) array of [x,y,s,r] states and
+    returns an (N,4) array of [x1,y1,x2,y2] boxes
+  """
+  w = np.sqrt(x[:, 2] * x[:, 3])
+  h = x[:, 2] / w
+  return np.stack((x[:, 0]-w/2., x[:, 1]-h/2., x[:, 0]+w/2., x[:, 1]+h/2.), axis=1)
+
+
+# Below this many detection/tracker pairs (roughly 250 people in frame) the dense
+# IoU matrix is cheaper than gating, as crowded scenes form one large component anyway
+SPARSE_ASSOCIATION_MIN_PAIRS = 256 * 256
 
 
 def associate_detections_to_trackers(detections,trackers,iou_threshold = 0.3):
   """
   Assigns detections to tracked object (both represented as bounding boxes)
 
-  Returns 3 lists of matches, unmatched_detections and unmatched_trackers
+  Returns 3 lists of matches, unmatched_detections and unmatched_trackers, the
+  unmatched indices in ascending order
   """
   if(len(trackers)==0):
     return np.empty((0,2),dtype=int), np.arange(len(detections)), np.empty((0,5),dtype=int)
 
+  if(len(detections)*len(trackers) >= SPARSE_ASSOCIATION_MIN_PAIRS and iou_threshold > 0
+     and _positive_areas(detections) and _positive_areas(trackers)):
+    return _associate_sparse(detections, trackers, iou_threshold)
+
   iou_matrix = iou_batch(detections, trackers)
 
   if min(iou_matrix.shape) > 0:
@@ -169,31 +161,273 @@ def associate_detections_to_trackers(detections,trackers,iou_threshold = 0.3):
     else:
       matched_indices = linear_assignment(-iou_matrix)
   else:
-    matched_indices = np.empty(shape=(0,2))
-
-  unmatched_detections = []
-  for d, det in enumerate(detections):
-    if(d not in matched_indices[:,0]):
-      unmatched_detections.append(d)
-  unmatched_trackers = []
-  for t, trk in enumerate(trackers):
-    if(t not in matched_indices[:,1]):
-      unmatched_trackers.append(t)
+    matched_indices = np.empty(shape=(0,2),dtype=int)
 
   #filter out matched with low IOU
-  matches = []
-  for m in matched_indices:
-    if(iou_matrix[m[0], m[1]]<iou_threshold):
-      unmatched_detections.append(m[0])
-      unmatched_trackers.append(m[1])
-    else:
-      matches.append(m.reshape(1,2))
-  if(len(matches)==0):
-    matches = np.empty((0,2),dtype=int)
+  matched_indices = matched_indices.astype(int)
+  matched_indices = matched_indices[iou_matrix[matched_indices[:,0], matched_indices[:,1]] >= iou_threshold]
+  return matched_indices, _unmatched(len(detections), matched_indices[:,0]), _unmatched(len(trackers), matched_indices[:,1])
+
+
+def _unmatched(n, matched):
+  """
+  Returns, in ascending order, the indices below n that are not in matched.
+  """
+  mask = np.ones(n, dtype=bool)
+  mask[matched] = False
+  return np.nonzero(mask)[0]
+
+
+def _positive_areas(bboxes):
+  w = bboxes[:, 2] - bboxes[:, 0]
+  h = bboxes[:, 3] - bboxes[:, 1]
+  return bool(np.all((w > 0) & (h > 0)))
+
+
+def _overlapping_pairs(detections, trackers):
+  """
+  Returns the (detection, tracker) index pairs whose boxes overlap. Trackers are
+  sorted by their left edge, so each detection is only compared against the
+  trackers whose left edge lies within one tracker width of its own.
+  """
+  order = np.argsort(trackers[:, 0], kind='stable')
+  left = trackers[order, 0]
+  max_width = (trackers[:, 2] - trackers[:, 0]).max()
+  lo = np.searchsorted(left, detections[:, 0] - max_width, side='right')
+  hi = np.searchsorted(left, detections[:, 2], side='left')
+  counts = np.maximum(hi - lo, 0)
+
+  d = np.repeat(np.arange(len(detections)), counts)
+  offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+  t = order[np.repeat(lo, counts) + offsets]
+  overlap = ((np.minimum(detections[d, 2], trackers[t, 2]) > np.maximum(detections[d, 0], trackers[t, 0])) &
+             (np.minimum(detections[d, 3], trackers[t, 3]) > np.maximum(detections[d, 1], trackers[t, 1])))
+  return d[overlap], t[overlap]
+
+
+def _pair_iou(bb_test, bb_gt):
+  """
+  IOU of matching rows of two box arrays, computed exactly as iou_batch does.
+  """
+  xx1 = np.maximum(bb_test[..., 0], bb_gt[..., 0])
+  yy1 = np.maximum(bb_test[..., 1], bb_gt[..., 1])
+  xx2 = np.minimum(bb_test[..., 2], bb_gt[..., 2])
+  yy2 = np.minimum(bb_test[..., 3], bb_gt[..., 3])
+  w = np.maximum(0., xx2 - xx1)
+  h = np.maximum(0., yy2 - yy1)
+  wh = w * h
+  return wh / ((bb_test[..., 2] - bb_test[..., 0]) * (bb_test[..., 3] - bb_test[..., 1])
+    + (bb_gt[..., 2] - bb_gt[..., 0]) * (bb_gt[..., 3] - bb_gt[..., 1]) - wh)
+
+
+def _components(n_detections, d, t):
+  """
+  Labels the connected components of the bipartite overlap graph, with detection
+  i as node i and tracker j as node n_detections + j. Returns the label of every
+  node; nodes without an edge keep their own index as label.
+  """
+  u = d
+  v = t + n_detections
+  labels = np.arange(n_detections + (t.max() + 1 if len(t) else 0))
+  while True:
+    low = np.minimum(labels[u], labels[v])
+    updated = labels.copy()
+    np.minimum.at(updated, u, low)
+    np.minimum.at(updated, v, low)
+    updated = updated[updated] # pointer jumping
+    if np.array_equal(updated, labels):
+      return labels
+    labels = updated
+
+
+def _component_members(nodes, labels):
+  """
+  Sorts the nodes by component and returns them with, for every node index, its
+  position within its component, and for every label, where its members start.
+  """
+  nodes = nodes[np.lexsort((nodes, labels[nodes]))]
+  node_labels = labels[nodes]
+  begin = np.searchsorted(node_labels, np.arange(len(labels)))
+  local = np.zeros(len(labels), dtype=int)
+  local[nodes] = np.arange(len(nodes)) - begin[node_labels]
+  return nodes, local, begin
+
+
+def _associate_sparse(detections, trackers, iou_threshold):
+  """
+  Same result as the dense path of associate_detections_to_trackers, for boxes
+  with positive area and iou_threshold > 0, without building the full IoU matrix.
+
+  Only overlapping pairs can have a positive IoU, so the optimal assignment over
+  the full matrix decomposes into independent problems, one per connected
+  component of the overlap graph; every other pairing it makes has IoU 0 and is
+  dropped by the threshold anyway. Components with a single detection or a
+  single tracker simply take their highest IoU pair, and only the rest go
+  through linear_assignment. Matches are identical (up to ties between equally
+  good assignments), and so are the unmatched indices, in ascending order.
+  """
+  n_detections = len(detections)
+  d, t = _overlapping_pairs(detections, trackers)
+  iou = _pair_iou(detections[d], trackers[t])
+
+  above = iou > iou_threshold
+  if above.any():
+    det_hits = np.bincount(d[above], minlength=n_detections)
+    trk_hits = np.bincount(t[above], minlength=len(trackers))
+  if above.any() and det_hits.max() == 1 and trk_hits.max() == 1:
+    # unambiguous: every box overlaps at most one other above the threshold
+    order = np.argsort(d[above], kind='stable')
+    matches = np.stack((d[above][order], t[above][order]), axis=1)
+  elif len(d) == 0:
+    matches = np.empty((0, 2), dtype=int)
   else:
-    matches = np.concatenate(matches,axis=0)
+    labels = _components(n_detections, d, t)
+    edge_labels = labels[d]
+    rows, local_row, row_begin = _component_members(np.unique(d), labels)
+    cols, local_col, col_begin = _component_members(np.unique(t) + n_detections, labels)
+    n_rows = np.bincount(labels[rows], minlength=len(labels))
+    n_cols = np.bincount(labels[cols], minlength=len(labels))
+
+    # one detection or one tracker: the assignment takes the highest IoU pair
+    star = (n_rows[edge_labels] == 1) | (n_cols[edge_labels] == 1)
+    edges = np.nonzero(star)[0]
+    edges = edges[np.lexsort((-iou[edges], edge_labels[edges]))]
+    best = edges[np.r_[True, np.diff(edge_labels[edges]) != 0]] if len(edges) else edges
+    matches = [np.stack((d[best], t[best]), axis=1)]
+
+    edges = np.nonzero(~star)[0]
+    edges = edges[np.argsort(edge_labels[edges], kind='stable')]
+    bounds = np.nonzero(np.diff(edge_labels[edges]))[0] + 1
+    for component in (np.split(edges, bounds) if len(edges) else []):
+      label = edge_labels[component[0]]
+      sub = np.zeros((n_rows[label], n_cols[label]))
+      sub[local_row[d[component]], local_col[t[component] + n_detections]] = iou[component]
+      assigned = linear_assignment(-sub).astype(int).reshape(-1, 2)
+      matches.append(np.stack((rows[row_begin[label] + assigned[:, 0]],
+                               cols[col_begin[label] + assigned[:, 1]] - n_detections), axis=1))
+    matches = np.concatenate(matches)
+
+    #filter out matched with low IOU
+    matches = matches[_pair_iou(detections[matches[:, 0]], trackers[matches[:, 1]]) >= iou_threshold]
+    matches = matches[np.argsort(matches[:, 0], kind='stable')]
+
+  return matches, _unmatched(n_detections, matches[:, 0]), _unmatched(len(trackers), matches[:, 1])
+
+
+class KalmanBoxBank(object):
+  """
+  Struct-of-arrays state of all the tracks of a Sort instance. Uses the constant
+  velocity model of the original per-object filterpy KalmanFilter trackers, but
+  predicts and updates every track with a handful of batched NumPy operations.
+  Track ids are numbered from 0 per bank.
+  """
+  F = np.array([[1,0,0,0,1,0,0],[0,1,0,0,0,1,0],[0,0,1,0,0,0,1],[0,0,0,1,0,0,0],  [0,0,0,0,1,0,0],[0,0,0,0,0,1,0],[0,0,0,0,0,0,1]], dtype=float)
+  H = np.array([[1,0,0,0,0,0,0],[0,1,0,0,0,0,0],[0,0,1,0,0,0,0],[0,0,0,1,0,0,0]], dtype=float)
+  R = np.diag([1., 1., 10., 10.])
+  Q = np.diag([1., 1., 1., 1., 0.01, 0.01, 0.0001])
+  P0 = np.diag([10., 10., 10., 10., 10000., 10000., 10000.]) #high uncertainty for the unobservable initial velocities
+  I = np.eye(7)
+
+  def __init__(self):
+    self.x = np.zeros((0, 7))
+    self.P = np.zeros((0, 7, 7))
+    self.ids = np.zeros(0, dtype=int)
+    self.time_since_update = np.zeros(0, dtype=int)
+    self.hits = np.zeros(0, dtype=int)
+    self.hit_streak = np.zeros(0, dtype=int)
+    self.age = np.zeros(0, dtype=int)
+    self.next_id = 0
+
+  def __len__(self):
+    return len(self.ids)
+
+  def add(self, bboxes):
+    """
+    Initialises one track per row of bboxes, in order.
+    """
+    n = len(bboxes)
+    if n == 0:
+      return
+    x = np.zeros((n, 7))
+    x[:, :4] = convert_bboxes_to_z(bboxes)
+    ids = np.arange(self.next_id, self.next_id + n)
+    self.next_id += n
+    zeros = np.zeros(n, dtype=int)
+    self.x = np.concatenate((self.x, x))
+    self.P = np.concatenate((self.P, np.broadcast_to(self.P0, (n, 7, 7))))
+    self.ids = np.concatenate((self.ids, ids))
+    self.time_since_update = np.concatenate((self.time_since_update, zeros))
+    self.hits = np.concatenate((self.hits, zeros))
+    self.hit_streak = np.concatenate((self.hit_streak, zeros))
+    self.age = np.concatenate((self.age, zeros))
+
+  def predict(self):
+    """
+    Advances every state vector and returns the (N,4) predicted bounding boxes.
+    """
+    self.x[(self.x[:, 6] + self.x[:, 2]) <= 0, 6] *= 0.0
+    self.x = self.x @ self.F.T
+    self.P = self.F @ self.P @ self.F.T + self.Q
+    self.age += 1
+    self.hit_streak[self.time_since_update > 0] = 0
+    self.time_since_update += 1
+    return convert_x_to_bboxes(self.x)
 
-  return matches, np.array(unmatched_detections), np.array(unmatched_trackers)
+  def update(self, idx, bboxes):
+    """
+    Updates the tracks at positions idx with the matching rows of bboxes.
+    """
+    if len(idx) == 0:
+      return
+    x = self.x[idx]
+    P = self.P[idx]
+    y = convert_bboxes_to_z(bboxes) - x[:, :4]
+    PHT = P @ self.H.T
+    S = self.H @ PHT + self.R
+    K = PHT @ np.linalg.inv(S)
+    self.x[idx] = x + (K @ y[:, :, None])[:, :, 0]
+    I_KH = self.I - K @ self.H
+    self.P[idx] = I_KH @ P @ I_KH.transpose(0, 2, 1) + K @ self.R @ K.transpose(0, 2, 1)
+
+    self.time_since_update[idx] = 0
+    self.hits[idx] += 1
+    self.hit_streak[idx] += 1
+
+  def get_state(self):
+    """
+    Returns the (N,4) current bounding box estimates.
+    """
+    return convert_x_to_bboxes(self.x)
+
+  def keep(self, mask):
+    """
+    Drops every track whose entry in the boolean mask is False.
+    """
+    self.x = self.x[mask]
+    self.P = self.P[mask]
+    self.ids = self.ids[mask]
+    self.time_since_update = self.time_since_update[mask]
+    self.hits = self.hits[mask]
+    self.hit_streak = self.hit_streak[mask]
+    self.age = self.age[mask]
+
+  STATE = ('x', 'P', 'ids', 'time_since_update', 'hits', 'hit_streak', 'age')
+
+  def state(self):
+    """
+    Returns a copy of every track array, keyed by attribute name, and the next id.
+    """
+    return dict({name: getattr(self, name).copy() for name in self.STATE}, next_id=np.array(self.next_id))
+
+  def load_state(self, state):
+    """
+    Replaces the tracks with a state returned by state(). Ids handed out afterwards
+    continue after the restored ones.
+    """
+    for name in self.STATE:
+      setattr(self, name, np.array(state[name], dtype=getattr(self, name).dtype))
+    # states saved without next_id continue after the newest restored track
+    self.next_id = int(state['next_id']) if 'next_id' in state else int(self.ids.max()) + 1 if len(self.ids) else 0
 
 
 class Sort(object):
@@ -204,7 +438,7 @@ class Sort(object):
     self.max_age = max_age
     self.min_hits = min_hits
     self.iou_threshold = iou_threshold
-    self.trackers = []
+    self.tracks = KalmanBoxBank()
     self.frame_count = 0
 
   def update(self, dets=np.empty((0, 5))):
@@ -218,40 +452,113 @@ class Sort(object):
     """
     self.frame_count += 1
     # get predicted locations from existing trackers.
-    trks = np.zeros((len(self.trackers), 5))
-    to_del = []
-    ret = []
-    for t, trk in enumerate(trks):
-      pos = self.trackers[t].predict()[0]
-      trk[:] = [pos[0], pos[1], pos[2], pos[3], 0]
-      if np.any(np.isnan(pos)):
-        to_del.append(t)
-    trks = np.ma.compress_rows(np.ma.masked_invalid(trks))
-    for t in reversed(to_del):
-      self.trackers.pop(t)
+    trks = self.tracks.predict()
+    valid = ~np.any(np.isnan(trks), axis=1)
+    if not valid.all():
+      self.tracks.keep(valid)
+      trks = trks[valid]
     matched, unmatched_dets, unmatched_trks = associate_detections_to_trackers(dets,trks, self.iou_threshold)
 
     # update matched trackers with assigned detections
-    for m in matched:
-      self.trackers[m[1]].update(dets[m[0], :])
+    self.tracks.update(matched[:, 1], dets[matched[:, 0], :4])
 
     # create and initialise new trackers for unmatched detections
-    for i in unmatched_dets:
-        trk = KalmanBoxTracker(dets[i,:])
-        self.trackers.append(trk)
-    i = len(self.trackers)
-    for trk in reversed(self.trackers):
-        d = trk.get_state()[0]
-        if (trk.time_since_update < 1) and (trk.hit_streak >= self.min_hits or self.frame_count <= self.min_hits):
-          ret.append(np.concatenate((d,[trk.id+1])).reshape(1,-1)) # +1 as MOT benchmark requires positive
-        i -= 1
-        # remove dead tracklet
-        if(trk.time_since_update > self.max_age):
-          self.trackers.pop(i)
+    self.tracks.add(dets[np.asarray(unmatched_dets, dtype=int), :4])
+
+    tracks = self.tracks
+    alive = (tracks.time_since_update < 1) & ((tracks.hit_streak >= self.min_hits) | (self.frame_count <= self.min_hits))
+    out = np.nonzero(alive)[0][::-1] # newest first, as in the per-object implementation
+    ret = np.concatenate((tracks.get_state()[out], tracks.ids[out, None] + 1), axis=1) # +1 as MOT benchmark requires positive
+    # remove dead tracklet
+    tracks.keep(tracks.time_since_update <= self.max_age)
     if(len(ret)>0):
-      return np.concatenate(ret)
+      return ret
     return np.empty((0,5))
 
+  def state(self):
+    """
+    Returns the tracker state (tracks and frame count) as a dict of arrays, e.g. for
+    a checkpoint that load_state restores after a restart.
+    """
+    return dict(self.tracks.state(), frame_count=np.array(self.frame_count))
+
+  def load_state(self, state):
+    self.tracks.load_state(state)
+    self.frame_count = int(state['frame_count'])
+
+  def active_ids(self):
+    """
+    Returns the ids, as reported by update, of every track that is still alive.
+    """
+    return self.tracks.ids + 1
+
+def load_detections(seq_dets_fn):
+  """
+  Loads a MOT det.txt sorted by frame, and the offsets where each frame starts, so
+  that frame f (1-based) is seq_dets[bounds[f-1]:bounds[f]] without scanning the
+  whole array. Detections keep their file order within a frame.
+  """
+  seq_dets = np.loadtxt(seq_dets_fn, delimiter=',', ndmin=2)
+  seq_dets = seq_dets[np.argsort(seq_dets[:, 0], kind='stable')]
+  n_frames = int(seq_dets[:, 0].max()) if len(seq_dets) else 0
+  bounds = np.searchsorted(seq_dets[:, 0], np.arange(1, n_frames + 2), side='left')
+  return seq_dets, bounds
+
+
+def frame_detections(seq_dets, bounds, frame):
+  dets = seq_dets[bounds[frame - 1]:bounds[frame], 2:7].copy()
+  dets[:, 2:4] += dets[:, 0:2] #convert to [x1,y1,w,h] to [x1,y1,x2,y2]
+  return dets
+
+
+def run_sequence(seq_dets_fn, out_path, max_age, min_hits, iou_threshold):
+  """
+  Tracks one sequence and writes its results in MOT format. Track ids start at 1
+  in every sequence, whichever process runs it. Returns (frames, tracking seconds).
+  """
+  mot_tracker = Sort(max_age=max_age, min_hits=min_hits, iou_threshold=iou_threshold)
+  seq_dets, bounds = load_detections(seq_dets_fn)
+  n_frames = len(bounds) - 1
+  total_time = 0.0
+  lines = []
+  for frame in range(1, n_frames + 1): #detection and frame numbers begin at 1
+    dets = frame_detections(seq_dets, bounds, frame)
+    start_time = time.time()
+    trackers = mot_tracker.update(dets)
+    total_time += time.time() - start_time
+    lines.extend('%d,%d,%.2f,%.2f,%.2f,%.2f,1,-1,-1,-1\n'%(frame,d[4],d[0],d[1],d[2]-d[0],d[3]-d[1]) for d in trackers)
+
+  with open(out_path, 'w') as out_file:
+    out_file.write(''.join(lines))
+  return n_frames, total_time
+
+
+def display_sequence(seq_dets_fn, seq, phase, args, ax1, fig, colours):
+  """
+  Tracks one sequence on screen, frame by frame (--display).
+  """
+  import matplotlib.pyplot as plt
+  import matplotlib.patches as patches
+  from skimage import io
+
+  mot_tracker = Sort(max_age=args.max_age[0], min_hits=args.min_hits[0], iou_threshold=args.iou_threshold[0])
+  seq_dets, bounds = load_detections(seq_dets_fn)
+  for frame in range(1, len(bounds)):
+    dets = frame_detections(seq_dets, bounds, frame)
+    fn = os.path.join('mot_benchmark', phase, seq, 'img1', '%06d.jpg'%(frame))
+    im =io.imread(fn)
+    ax1.imshow(im)
+    plt.title(seq + ' Tracked Targets')
+
+    for d in mot_tracker.update(dets):
+      d = d.astype(np.int32)
+      ax1.add_patch(patches.Rectangle((d[0],d[1]),d[2]-d[0],d[3]-d[1],fill=False,lw=3,ec=colours[d[4]%32,:]))
+
+    fig.canvas.flush_events()
+    plt.draw()
+    ax1.cla()
+
+
 def parse_args():
     """Parse input arguments."""
     parser = argparse.ArgumentParser(description='SORT demo')
@@ -259,12 +566,13 @@ def parse_args():
     parser.add_argument("--seq_path", help="Path to detections.", type=str, default='data')
     parser.add_argument("--phase", help="Subdirectory in seq_path.", type=str, default='train')
     parser.add_argument("--max_age", 
-                        help="Maximum number of frames to keep alive a track without associated detections.", 
-                        type=int, default=1)
+                        help="Maximum number of frames to keep alive a track without associated detections. Several values sweep them.", 
+                        type=int, nargs='+', default=[1])
     parser.add_argument("--min_hits", 
-                        help="Minimum number of associated detections before track is initialised.", 
-                        type=int, default=3)
-    parser.add_argument("--iou_threshold", help="Minimum IOU for match.", type=float, default=0.3)
+                        help="Minimum number of associated detections before track is initialised. Several values sweep them.", 
+                        type=int, nargs='+', default=[3])
+    parser.add_argument("--iou_threshold", help="Minimum IOU for match. Several values sweep them.", type=float, nargs='+', default=[0.3])
+    parser.add_argument("--workers", help="Sequences tracked in parallel [CPU count].", type=int, default=os.cpu_count())
     args = parser.parse_args()
     return args
 
@@ -273,58 +581,51 @@ if __name__ == '__main__':
   args = parse_args()
   display = args.display
   phase = args.phase
-  total_time = 0.0
-  total_frames = 0
-  colours = np.random.rand(32, 3) #used only for display
+  pattern = os.path.join(args.seq_path, phase, '*', 'det', 'det.txt')
+  sequences = [(fn, fn[pattern.find('*'):].split(os.path.sep)[0]) for fn in sorted(glob.glob(pattern))]
+
   if(display):
     if not os.path.exists('mot_benchmark'):
       print('\n\tERROR: mot_benchmark link not found!\n\n    Create a symbolic link to the MOT benchmark\n    (https://motchallenge.net/data/2D_MOT_2015/#download). E.g.:\n\n    $ ln -s /path/to/MOT2015_challenge/2DMOT2015 mot_benchmark\n\n')
       exit()
+    import matplotlib
+    matplotlib.use('TkAgg')
+    import matplotlib.pyplot as plt
     plt.ion()
     fig = plt.figure()
     ax1 = fig.add_subplot(111, aspect='equal')
-
-  if not os.path.exists('output'):
-    os.makedirs('output')
-  pattern = os.path.join(args.seq_path, phase, '*', 'det', 'det.txt')
-  for seq_dets_fn in glob.glob(pattern):
-    mot_tracker = Sort(max_age=args.max_age, 
-                       min_hits=args.min_hits,
-                       iou_threshold=args.iou_threshold) #create instance of the SORT tracker
-    seq_dets = np.loadtxt(seq_dets_fn, delimiter=',')
-    seq = seq_dets_fn[pattern.find('*'):].split(os.path.sep)[0]
-    
-    with open(os.path.join('output', '%s.txt'%(seq)),'w') as out_file:
+    colours = np.random.rand(32, 3) #used only for display
+    for seq_dets_fn, seq in sequences:
       print("Processing %s."%(seq))
-      for frame in range(int(seq_dets[:,0].max())):
-        frame += 1 #detection and frame numbers begin at 1
-        dets = seq_dets[seq_dets[:, 0]==frame, 2:7]
-        dets[:, 2:4] += dets[:, 0:2] #convert to [x1,y1,w,h] to [x1,y1,x2,y2]
-        total_frames += 1
-
-        if(display):
-          fn = os.path.join('mot_benchmark', phase, seq, 'img1', '%06d.jpg'%(frame))
-          im =io.imread(fn)
-          ax1.imshow(im)
-          plt.title(seq + ' Tracked Targets')
-
-        start_time = time.time()
-        trackers = mot_tracker.update(dets)
-        cycle_time = time.time() - start_time
-        total_time += cycle_time
-
-        for d in trackers:
-          print('%d,%d,%.2f,%.2f,%.2f,%.2f,1,-1,-1,-1'%(frame,d[4],d[0],d[1],d[2]-d[0],d[3]-d[1]),file=out_file)
-          if(display):
-            d = d.astype(np.int32)
-            ax1.add_patch(patches.Rectangle((d[0],d[1]),d[2]-d[0],d[3]-d[1],fill=False,lw=3,ec=colours[d[4]%32,:]))
-
-        if(display):
-          fig.canvas.flush_events()
-          plt.draw()
-          ax1.cla()
-
-  print("Total Tracking took: %.3f seconds for %d frames or %.1f FPS" % (total_time, total_frames, total_frames / total_time))
-
-  if(display):
+      display_sequence(seq_dets_fn, seq, phase, args, ax1, fig, colours)
     print("Note: to get real runtime results run without the option: --display")
+    exit()
+
+  # One job per sequence and parameter combination. A single combination writes to
+  # output/ as before; a sweep writes each combination to its own subdirectory
+  combinations = list(itertools.product(args.max_age, args.min_hits, args.iou_threshold))
+  jobs = []
+  for max_age, min_hits, iou_threshold in combinations:
+    out_dir = 'output'
+    if len(combinations) > 1:
+      out_dir = os.path.join('output', 'max_age=%d_min_hits=%d_iou_threshold=%g'%(max_age, min_hits, iou_threshold))
+    os.makedirs(out_dir, exist_ok=True)
+    for seq_dets_fn, seq in sequences:
+      jobs.append((seq_dets_fn, os.path.join(out_dir, '%s.txt'%(seq)), max_age, min_hits, iou_threshold))
+
+  wall_start = time.time()
+  if args.workers > 1 and len(jobs) > 1:
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+      results = list(executor.map(run_sequence, *zip(*jobs)))
+  else:
+    results = [run_sequence(*job) for job in jobs]
+
+  totals = {}
+  for job, (frames, seconds) in zip(jobs, results):
+    print("Processed %s."%(job[1]))
+    total_frames, total_time = totals.get(job[2:], (0, 0.0))
+    totals[job[2:]] = (total_frames + frames, total_time + seconds)
+  for (max_age, min_hits, iou_threshold), (total_frames, total_time) in totals.items():
+    print("max_age=%d min_hits=%d iou_threshold=%g: Total Tracking took: %.3f seconds for %d frames or %.1f FPS"
+          % (max_age, min_hits, iou_threshold, total_time, total_frames, total_frames / max(total_time, 1e-9)))
+  print("Wall time: %.3f seconds for %d jobs on %d workers" % (time.time() - wall_start, len(jobs), max(1, min(args.workers, len(jobs)))))
@@ -0,0 +1,322 @@
+"""
+Process mode for the counting service (WORKER_MODE=process).
+
+StreamSupervisor runs in the web process and starts one worker process per group
+of streams with `python -m supervisor`. Each worker connects back over an
+authenticated local socket, runs its streams with its own detector and Sort
+trackers, and sends crossings, stream stats and encoded preview chunks back.
+"""
+import functools
+import json
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from broadcast import MjpegBroadcaster
+from metrics import MetricsMirror, MetricsRegistry, StageTimers
+
+# Seconds between the stream stats a worker process sends back to the web process
+STATS_INTERVAL = 1.0
+
+
+# Parse WORKER_GROUPS, e.g. "1,2;3,4", into lists of 0-based stream indexes.
+# Stream ids are 1-based like RSTP_LINK_<n>; every stream not listed gets a process of its own
+def parse_groups(spec, streams):
+    groups = []
+    seen = set()
+    for part in (spec or '').split(';'):
+        if not part.strip():
+            continue
+        group = []
+        for value in part.split(','):
+            index = int(value) - 1
+            if not 0 <= index < streams or index in seen:
+                raise ValueError(f"Invalid WORKER_GROUPS spec {spec!r}: stream {value.strip()} is unknown or listed twice")
+            seen.add(index)
+            group.append(index)
+        groups.append(group)
+    groups.extend([i] for i in range(streams) if i not in seen)
+    return groups
+
+
+class Channel(object):
+    """
+    Connection shared by several threads; sends are serialised, receives happen
+    on a single thread.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self.lock = threading.Lock()
+
+    def send(self, message):
+        with self.lock:
+            self.connection.send(message)
+
+    def recv(self):
+        return self.connection.recv()
+
+    def poll(self, timeout):
+        return self.connection.poll(timeout)
+
+    def close(self):
+        self.connection.close()
+
+
+class RemoteBroadcaster(MjpegBroadcaster):
+    """
+    Broadcaster used inside a worker process. Frames are encoded at the preview
+    rate exactly like MjpegBroadcaster, but only while the web process reports
+    viewers for the stream, and the chunks are sent to the web process instead
+    of being served from here.
+    """
+    def __init__(self, url_index, channel, viewers, preview_fps=10.0, jpeg_quality=80, encode_timer=None):
+        super().__init__(preview_fps, jpeg_quality, encode_timer)
+        self.url_index = url_index
+        self.channel = channel
+        self.viewers = viewers
+
+    def has_subscribers(self):
+        return self.viewers[self.url_index] > 0
+
+    def publish_chunk(self, chunk):
+        self.channel.send(('preview', self.url_index, chunk))
+
+
+# Body of a worker process: one detector, and one StreamWorker with its own Sort
+# tracker and line counter per stream of the group. The daily totals drawn on the
+# preview and the viewer counts are pushed by the web process, which gets stream
+# stats and a snapshot of the stage timings and inference metrics back
+def run_worker_group(channel, group, url_indexes, settings):
+    from detectors import load_detector
+    from inference import BatchInferenceScheduler
+    from pipeline import CountingPipeline, StreamWorker
+
+    urls = settings['urls']
+    frame_size = tuple(settings['frame_size'])
+    counts = [0 for _ in urls]
+    viewers = [0 for _ in urls]
+    registry = MetricsRegistry()
+
+    inference = BatchInferenceScheduler(
+        load_detector(**settings['detector']),
+        streams=len(url_indexes),
+        max_batch=settings['max_batch'],
+        max_wait=settings['max_wait'],
+        batch_timer=registry.histogram('people_counter_inference_batch_seconds', 'Time to run one detector batch',
+                                       group=group + 1),
+        batch_sizes=registry.histogram('people_counter_inference_batch_size', 'Frames per detector batch',
+                                       buckets=(1, 2, 4, 8, 16, 32), group=group + 1),
+    )
+    registry.gauge('people_counter_inference_queue_depth', 'Frames waiting for the detector',
+                   read=lambda: len(inference.pending), group=group + 1)
+    inference.start()
+
+    def on_count(url_index, direction, first):
+        channel.send(('crossing', url_index, (direction, first)))
+
+    def get_count(url_index):
+        return counts[url_index]
+
+    workers = []
+    for i in url_indexes:
+        timers = StageTimers(registry, i + 1)
+        pipeline = CountingPipeline.from_env(i + 1, functools.partial(inference.detect, i), frame_size, timers=timers)
+        broadcaster = RemoteBroadcaster(i, channel, viewers, settings['preview_fps'], settings['jpeg_quality'],
+                                        encode_timer=timers.encode)
+        workers.append(StreamWorker(i, urls[i], pipeline, on_count, get_count, broadcaster, frame_size=frame_size))
+    for worker in workers:
+        worker.start()
+
+    next_stats = 0.0
+    while any(worker.is_alive() for worker in workers):
+        now = time.monotonic()
+        if now >= next_stats:
+            for worker in workers:
+                channel.send(('stats', worker.url_index, worker.stats()))
+            channel.send(('metrics', group, registry.snapshot()))
+            next_stats = now + STATS_INTERVAL
+        if channel.poll(max(0.0, next_stats - time.monotonic())):
+            kind, url_index, value = channel.recv()
+            if kind == 'count':
+                counts[url_index] = value
+            elif kind == 'viewers':
+                viewers[url_index] = value
+
+
+class StreamSupervisor(threading.Thread):
+    """
+    Runs the streams in worker processes, one per group from parse_groups, so the
+    Python parts of the pipeline are spread over several cores instead of sharing
+    one GIL. The web process stays the owner of the daily counts: workers only
+    report crossings, which are passed to on_count, so a crashed worker is simply
+    restarted (with exponential backoff) and nothing counted so far is lost. Its
+    tracks are, so a person crossing while it restarts is not counted.
+    """
+    def __init__(self, urls, groups, on_count, broadcasters, settings, min_backoff=1.0, max_backoff=30.0,
+                 metrics_registry=None):
+        super().__init__(name='supervisor', daemon=True)
+        self.urls = urls
+        self.groups = groups
+        self.on_count = on_count
+        self.broadcasters = broadcasters
+        self.settings = settings
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+        self.authkey = secrets.token_bytes(32)
+        self.listener = Listener(family='AF_UNIX', authkey=self.authkey)
+        self.processes = [None for _ in groups]
+        self.channels = [None for _ in groups]
+        self.restarts = [0 for _ in groups]
+        self.counts = [0 for _ in urls]  # daily totals drawn on the preview
+        self.viewers = [0 for _ in urls]  # /video_feed clients last sent to the workers
+        self.stats = [{} for _ in urls]  # latest StreamWorker.stats() of every stream
+        # Stage timings and inference metrics of every group's process, copied into metrics_registry
+        self.metrics = [MetricsMirror(metrics_registry) if metrics_registry is not None else None for _ in groups]
+        self.stopped = False
+
+    def _group_of(self, url_index):
+        return next(group for group, indexes in enumerate(self.groups) if url_index in indexes)
+
+    def _send(self, group, message):
+        channel = self.channels[group]
+        if channel is None:
+            return
+        try:
+            channel.send(message)
+        except (OSError, EOFError):
+            pass  # the worker is gone; it gets the current values again when it reconnects
+
+    def set_count(self, url_index, count):
+        self.counts[url_index] = count
+        self._send(self._group_of(url_index), ('count', url_index, count))
+
+    def stream_stats(self, url_index):
+        group = self._group_of(url_index)
+        stats = dict(self.stats[url_index])
+        if self.channels[group] is None:
+            stats['connected'] = False
+        stats['restarts'] = self.restarts[group]
+        return stats
+
+    def _spawn(self, group):
+        indexes = self.groups[group]
+        env = dict(os.environ,
+                   WORKER_AUTHKEY=self.authkey.hex(),
+                   WORKER_SETTINGS=json.dumps(dict(self.settings, urls=self.urls)))
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'supervisor', self.listener.address, str(group), ','.join(str(i) for i in indexes)],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+        self.processes[group] = process
+        print(f"Started worker process for streams {', '.join(str(i + 1) for i in indexes)} (pid {process.pid})")
+
+    def _accept(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except Exception as e:
+                if self.stopped:
+                    return
+                print(f"Error while accepting a worker connection: {e}")
+                continue
+            threading.Thread(target=self._serve, args=(Channel(connection),), daemon=True).start()
+
+    def _serve(self, channel):
+        # The first message names the group; everything after it comes from the group's streams
+        try:
+            _, group = channel.recv()
+        except (OSError, EOFError):
+            return
+        self.channels[group] = channel
+        if self.metrics[group] is not None:
+            self.metrics[group].restart()
+        for i in self.groups[group]:
+            self._send(group, ('count', i, self.counts[i]))
+            self._send(group, ('viewers', i, self.viewers[i]))
+
+        try:
+            while True:
+                kind, url_index, payload = channel.recv()
+                if kind == 'crossing':
+                    try:
+                        self.on_count(url_index, *payload)
+                    except Exception as e:
+                        print(f"Error while recording crossing of stream {url_index + 1}: {e}")
+                elif kind == 'stats':
+                    self.stats[url_index] = payload
+                elif kind == 'metrics':
+                    if self.metrics[url_index] is not None:
+                        self.metrics[url_index].update(payload)
+                elif kind == 'preview':
+                    self.broadcasters[url_index].publish_chunk(payload)
+        except (OSError, EOFError):
+            pass
+        finally:
+            if self.channels[group] is channel:
+                self.channels[group] = None
+            channel.close()
+
+    def stop(self):
+        self.stopped = True
+        for process in self.processes:
+            if process is not None and process.poll() is None:
+                process.terminate()
+        for process in self.processes:
+            if process is not None:
+                try:
+                    process.wait(5.0)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        self.listener.close()
+
+    def run(self):
+        threading.Thread(target=self._accept, name='supervisor-accept', daemon=True).start()
+
+        backoff = [self.min_backoff for _ in self.groups]
+        started_at = [0.0 for _ in self.groups]
+        retry_at = [0.0 for _ in self.groups]
+        while not self.stopped:
+            now = time.monotonic()
+            for group, process in enumerate(self.processes):
+                if process is not None and process.poll() is None:
+                    continue
+                if process is not None and retry_at[group] == 0.0:
+                    # A worker that ran for a while is restarted right away again; one that
+                    # keeps crashing at startup is retried less and less often
+                    if now - started_at[group] > self.max_backoff:
+                        backoff[group] = self.min_backoff
+                    print(f"Worker process {process.pid} exited with code {process.returncode}, "
+                          f"restarting in {backoff[group]:.1f}s")
+                    retry_at[group] = now + backoff[group]
+                    backoff[group] = min(backoff[group] * 2, self.max_backoff)
+                    self.restarts[group] += 1
+                if now >= retry_at[group]:
+                    self._spawn(group)
+                    started_at[group] = now
+                    retry_at[group] = 0.0
+
+            # Workers encode previews only for streams somebody is watching
+            for i, broadcaster in enumerate(self.broadcasters):
+                if broadcaster.subscribers != self.viewers[i]:
+                    self.viewers[i] = broadcaster.subscribers
+                    self._send(self._group_of(i), ('viewers', i, self.viewers[i]))
+            time.sleep(0.5)
+
+
+def main():
+    address, group, indexes = sys.argv[1:4]
+    channel = Channel(Client(address, authkey=bytes.fromhex(os.environ['WORKER_AUTHKEY'])))
+    channel.send(('hello', int(group)))
+    # Exits once every stream has stopped, or when the web process goes away
+    try:
+        run_worker_group(channel, int(group), [int(i) for i in indexes.split(',')],
+                         json.loads(os.environ['WORKER_SETTINGS']))
+    except (OSError, EOFError):
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import threading
+import time
+
+from capture import FfmpegReader, FrameGrabber, default_input_options
+
+
+class StallingReader(object):
+    # Delivers one frame, then blocks like a source that keeps the connection open but sends nothing
+    def __init__(self):
+        self.frames = 0
+        self.interrupted = threading.Event()
+
+    def read(self, out):
+        self.frames += 1
+        if self.frames > 1:
+            self.interrupted.wait()
+            return False
+        return True
+
+    def interrupt(self):
+        self.interrupted.set()
+
+    def release(self):
+        self.interrupt()
+
+
+class StallingGrabber(FrameGrabber):
+    def _open(self):
+        return StallingReader()
+
+
+def test_watchdog_reconnects_a_stalled_source():
+    grabber = StallingGrabber('stalled', frame_size=(64, 48), min_backoff=0.01, stall_timeout=0.2)
+    grabber.start()
+    try:
+        deadline = time.monotonic() + 5.0
+        while grabber.reconnects < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert grabber.reconnects >= 2
+    finally:
+        grabber.close()
+
+
+def test_rtsp_defaults_to_tcp_with_a_socket_timeout():
+    assert default_input_options('rtsp://camera/stream', 5.0) == ['-rtsp_transport', 'tcp', '-timeout', '5000000']
+    assert default_input_options('clip.mp4', 5.0) == []
+
+
+def test_input_options_replace_the_defaults(monkeypatch):
+    commands = []
+    monkeypatch.setattr('subprocess.Popen', lambda command, **kwargs: commands.append(command))
+    FfmpegReader('rtsp://camera/stream', (64, 48), input_options=['-rtsp_transport', 'udp'])
+    assert commands[0][commands[0].index('-i') - 2:commands[0].index('-i')] == ['-rtsp_transport', 'udp']
+    assert '-timeout' not in commands[0]
@@ -0,0 +1,46 @@
+import numpy as np
+
+from counting import LineCrossingCounter
+
+
+def track(track_id, centre_y, centre_x=320, half=20):
+    return [centre_x - half, centre_y - half, centre_x + half, centre_y + half, track_id]
+
+
+def run(counter, centres, track_id=1):
+    crossings = []
+    for centre_y in centres:
+        crossings.extend(counter.update(np.array([track(track_id, centre_y)]), [track_id]))
+    return crossings
+
+
+def test_jitter_on_the_line_is_not_counted():
+    # The centre wobbles +/-2 px around the line for 50 frames
+    counter = LineCrossingCounter.parse('', (640, 480))
+    centres = [200] + [240 + (2 if i % 2 else -2) for i in range(50)]
+    assert run(counter, centres) == []
+    assert (counter.count_in, counter.count_out) == (0, 0)
+
+
+def test_jitter_beyond_the_margin_counts_each_direction_once():
+    counter = LineCrossingCounter.parse('', (640, 480))
+    centres = [200] + [240 + (15 if i % 2 else -15) for i in range(50)]
+    assert run(counter, centres) == [(1, 'in', True), (1, 'out', False)]
+
+
+def test_crossing_then_leaving_on_the_far_side_counts_once():
+    counter = LineCrossingCounter.parse('', (640, 480))
+    assert run(counter, [150, 200, 238, 242, 239, 241, 280, 330]) == [(1, 'in', True)]
+
+
+def test_margin_is_configurable():
+    counter = LineCrossingCounter.parse('', (640, 480), margin=1.0)
+    assert run(counter, [200, 238, 242]) == [(1, 'in', True)]
+
+
+def test_counted_directions_survive_a_checkpoint():
+    counter = LineCrossingCounter.parse('', (640, 480))
+    run(counter, [200, 280])
+    restored = LineCrossingCounter.parse('', (640, 480))
+    restored.load_state(counter.state())
+    assert run(restored, [200, 280]) == [(1, 'out', False)]
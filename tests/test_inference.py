@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from broadcast import MjpegBroadcaster
+from counting import LineCrossingCounter
+from inference import BatchInferenceScheduler
+from pipeline import CountingPipeline, StreamWorker
+from sort import Sort
+
+
+class ShortDetector(object):
+    def detect_batch(self, frames):
+        return []
+
+
+def test_scheduler_fails_frames_the_detector_returned_nothing_for():
+    scheduler = BatchInferenceScheduler(ShortDetector(), streams=1)
+    scheduler.start()
+    future = scheduler.submit(0, np.zeros((48, 64, 3), dtype=np.uint8))
+    with pytest.raises(RuntimeError):
+        future.result(timeout=5)
+
+
+def test_worker_survives_a_failed_detection_and_ages_tracks_out():
+    calls = []
+
+    def detect(frame):
+        calls.append(1)
+        if len(calls) > 3:
+            raise RuntimeError('detector failed')
+        return np.array([[300, 100, 340, 160, 0.9, 0]], dtype=np.float32)
+
+    pipeline = CountingPipeline(detect, Sort(max_age=1, min_hits=1), LineCrossingCounter.parse('', (640, 480)))
+    worker = StreamWorker(0, None, pipeline, lambda *args: None, lambda i: 0, MjpegBroadcaster())
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    try:
+        for _ in range(3):
+            worker._process(frame)
+        assert len(pipeline.tracker.active_ids()) == 1
+        for _ in range(3):
+            worker._process(frame)
+        assert len(pipeline.tracker.active_ids()) == 0
+    finally:
+        worker.grabber.close()
+
+
+def test_failed_crossing_record_does_not_update_the_tracker_twice():
+    centres = iter(range(150, 350, 20))
+
+    def detect(frame):
+        y = next(centres)
+        return np.array([[300, y - 30, 340, y + 30, 0.9, 0]], dtype=np.float32)
+
+    def on_count(url_index, direction, first):
+        raise RuntimeError('database unavailable')
+
+    pipeline = CountingPipeline(detect, Sort(max_age=1, min_hits=1), LineCrossingCounter.parse('', (640, 480)))
+    worker = StreamWorker(0, None, pipeline, on_count, lambda i: 0, MjpegBroadcaster())
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    try:
+        for frames in range(1, 11):
+            worker._process(frame)
+            assert pipeline.tracker.frame_count == frames
+    finally:
+        worker.grabber.close()
+    assert pipeline.counter.count_in == 1
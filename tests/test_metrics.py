@@ -0,0 +1,31 @@
+from metrics import MetricsMirror, MetricsRegistry, StageTimers
+
+
+def test_mirror_copies_worker_histograms_and_gauges():
+    worker, web = MetricsRegistry(), MetricsRegistry()
+    timers = StageTimers(worker, 1)
+    timers.inference.observe(0.02)
+    timers.encode.observe(0.004)
+    worker.gauge('people_counter_inference_queue_depth', 'Frames waiting for the detector', read=lambda: 3, group=1)
+
+    MetricsMirror(web).update(worker.snapshot())
+
+    mirrored = StageTimers(web, 1)
+    assert sum(mirrored.inference.counts) == 1 and mirrored.inference.sum == 0.02
+    assert sum(mirrored.encode.counts) == 1
+    assert 'people_counter_inference_queue_depth{group="1"} 3' in web.render()
+
+
+def test_mirror_keeps_counting_across_worker_restarts():
+    web = MetricsRegistry()
+    mirror = MetricsMirror(web)
+    for _ in range(2):
+        worker = MetricsRegistry()
+        worker.counter('people_counter_test_total', 'Test').inc(5)
+        StageTimers(worker, 1).tracking.observe(0.001)
+        mirror.restart()
+        mirror.update(worker.snapshot())
+        mirror.update(worker.snapshot())
+
+    assert web.counter('people_counter_test_total', 'Test').value == 10
+    assert sum(StageTimers(web, 1).tracking.counts) == 2
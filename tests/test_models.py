@@ -0,0 +1,41 @@
+from datetime import date, datetime, time
+
+import pytest
+from flask import Flask
+
+from models import VisitorCount, VisitorCountRollup, backfill_rollups, db, insert_visitor_counts
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def rollups(bucket):
+    rows = VisitorCountRollup.query.filter_by(bucket=bucket).order_by(VisitorCountRollup.bucket_start)
+    return [(row.stream_id, row.bucket_start, row.count) for row in rows]
+
+
+def test_backfill_adds_rows_recorded_before_the_rollups(app):
+    day = date(2026, 10, 1)
+    # Written before the rollups existed: a midnight reset row and three crossings
+    db.session.add(VisitorCount(day, 1, time(0, 0, 0), 0, 0))
+    for i, at in enumerate((time(8, 15, 5), time(8, 15, 5), time(9, 1, 0))):
+        db.session.add(VisitorCount(day, 1, at, i + 1, 1))
+    # and one written since, which is already rolled up
+    insert_visitor_counts([(1, datetime(2026, 10, 1, 9, 30, 0), 4)])
+    db.session.commit()
+
+    assert backfill_rollups() == 1
+    db.session.commit()
+    assert rollups('day') == [(1, datetime(2026, 10, 1), 4)]
+    assert rollups('hour') == [(1, datetime(2026, 10, 1, 8), 2), (1, datetime(2026, 10, 1, 9), 2)]
+    assert rollups('minute') == [(1, datetime(2026, 10, 1, 8, 15), 2), (1, datetime(2026, 10, 1, 9, 1), 1),
+                                 (1, datetime(2026, 10, 1, 9, 30), 1)]
+
+    assert backfill_rollups() == 0
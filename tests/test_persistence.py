@@ -0,0 +1,49 @@
+import time
+
+from persistence import WriteBehindWriter
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_failed_batch_is_retried_until_it_is_written():
+    written, attempts = [], []
+
+    def flush(batch):
+        attempts.append(len(batch))
+        if len(attempts) < 3:
+            raise ConnectionError('database unavailable')
+        written.extend(batch)
+
+    writer = WriteBehindWriter(flush, flush_interval=0.01, retry_backoff=0.01)
+    writer.start()
+    for i in range(5):
+        writer.submit(i)
+    assert wait_for(lambda: len(written) == 5)
+    writer.stop()
+    assert written == list(range(5))
+    assert writer.dropped_events == 0
+
+
+def test_batch_is_dropped_and_counted_after_the_last_retry():
+    def flush(batch):
+        raise ConnectionError('database unavailable')
+
+    writer = WriteBehindWriter(flush, flush_interval=0.01, max_retries=2, retry_backoff=0.01)
+    writer.start()
+    writer.submit(1)
+    writer.submit(2)
+    assert wait_for(lambda: writer.dropped_events == 2)
+    writer.stop()
+
+
+def test_submit_does_not_wait_for_a_full_queue():
+    writer = WriteBehindWriter(lambda batch: None, max_queue=2)  # not started, so nothing drains the queue
+    started = time.monotonic()
+    assert [writer.submit(i) for i in range(4)] == [True, True, False, False]
+    assert time.monotonic() - started < 0.5
+    assert writer.rejected_events == 2
@@ -0,0 +1,32 @@
+import numpy as np
+
+from broadcast import MjpegBroadcaster
+from counting import LineCrossingCounter
+from pipeline import CountingPipeline, StreamWorker
+from sort import Sort
+
+
+def test_crossings_are_recorded_before_a_checkpoint_can_read_the_counter():
+    centres = iter(range(150, 350, 20))
+
+    def detect(frame):
+        y = next(centres)
+        return np.array([[300, y - 30, 340, y + 30, 0.9, 0]], dtype=np.float32)
+
+    pipeline = CountingPipeline(detect, Sort(max_age=1, min_hits=1), LineCrossingCounter.parse('', (640, 480)))
+    recorded = []
+
+    def on_count(url_index, direction, first):
+        # A checkpoint taking pipeline.state() waits until the crossing is recorded
+        assert pipeline.lock.locked()
+        recorded.append(direction)
+
+    worker = StreamWorker(0, None, pipeline, on_count, lambda i: 0, MjpegBroadcaster())
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    try:
+        for _ in range(10):
+            worker._process(frame)
+    finally:
+        worker.grabber.close()
+    assert recorded == ['in']
+    assert pipeline.state(lambda: {'total': len(recorded)})['total'] == 1
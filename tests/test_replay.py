@@ -0,0 +1,13 @@
+import pytest
+
+from replay import output_names
+
+
+def test_output_names_keep_files_with_the_same_name_apart():
+    names = output_names(['footage/cam1/clip.mp4', 'footage/cam2/clip.mp4', 'lobby.mp4'])
+    assert names == ['cam1_clip.mp4', 'cam2_clip.mp4', 'lobby']
+
+
+def test_output_names_refuse_a_file_given_twice():
+    with pytest.raises(ValueError):
+        output_names(['clip.mp4', './clip.mp4'])
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+import sort
+
+
+def crowd(rng, n, size=2000.0):
+    corners = rng.uniform(0, size, (n, 2))
+    sizes = rng.uniform(20, 80, (n, 2))
+    return np.hstack((corners, corners + sizes))
+
+
+def test_sparse_association_matches_the_dense_path_including_order(monkeypatch):
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        trackers = crowd(rng, rng.integers(1, 120))
+        # detections near some of the tracks, plus new people
+        seen = trackers[rng.random(len(trackers)) < 0.8]
+        detections = np.vstack((seen + rng.normal(0, 8, seen.shape), crowd(rng, rng.integers(0, 40))))
+        detections[:, 2:] = np.maximum(detections[:, 2:], detections[:, :2] + 1)
+        detections = detections[rng.permutation(len(detections))]
+        if len(detections) == 0:
+            continue
+
+        sparse = sort._associate_sparse(detections, trackers, 0.3)
+        monkeypatch.setattr(sort, 'SPARSE_ASSOCIATION_MIN_PAIRS', float('inf'))
+        dense = sort.associate_detections_to_trackers(detections, trackers, 0.3)
+        monkeypatch.undo()
+        for sparse_part, dense_part in zip(sparse, dense):
+            np.testing.assert_array_equal(sparse_part, dense_part)
+
+
+class ReferenceTracker(object):
+    # The per-object filterpy tracker of the original SORT, which KalmanBoxBank vectorises
+    def __init__(self, bbox):
+        from filterpy.kalman import KalmanFilter
+        self.kf = KalmanFilter(dim_x=7, dim_z=4)
+        self.kf.F = np.array([[1, 0, 0, 0, 1, 0, 0], [0, 1, 0, 0, 0, 1, 0], [0, 0, 1, 0, 0, 0, 1], [0, 0, 0, 1, 0, 0, 0],
+                              [0, 0, 0, 0, 1, 0, 0], [0, 0, 0, 0, 0, 1, 0], [0, 0, 0, 0, 0, 0, 1]])
+        self.kf.H = np.array([[1, 0, 0, 0, 0, 0, 0], [0, 1, 0, 0, 0, 0, 0], [0, 0, 1, 0, 0, 0, 0], [0, 0, 0, 1, 0, 0, 0]])
+        self.kf.R[2:, 2:] *= 10.
+        self.kf.P[4:, 4:] *= 1000.
+        self.kf.P *= 10.
+        self.kf.Q[-1, -1] *= 0.01
+        self.kf.Q[4:, 4:] *= 0.01
+        self.kf.x[:4] = sort.convert_bbox_to_z(bbox)
+
+    def predict(self):
+        if (self.kf.x[6] + self.kf.x[2]) <= 0:
+            self.kf.x[6] *= 0.0
+        self.kf.predict()
+        return sort.convert_x_to_bbox(self.kf.x)[0]
+
+
+def test_kalman_bank_matches_the_per_object_filters():
+    pytest.importorskip('filterpy')
+    rng = np.random.default_rng(1)
+    bank = sort.KalmanBoxBank()
+    reference = []
+    for frame in range(60):
+        predicted = bank.predict()
+        for tracker, box in zip(reference, predicted):
+            np.testing.assert_allclose(box, tracker.predict(), rtol=1e-9, atol=1e-6)
+
+        # update a random subset of the tracks, drifting, and start a few new ones
+        idx = np.nonzero(rng.random(len(bank)) < 0.7)[0]
+        boxes = predicted[idx] + rng.normal(0, 1, (len(idx), 4))
+        bank.update(idx, boxes)
+        for i, box in zip(idx, boxes):
+            reference[i].kf.update(sort.convert_bbox_to_z(box))
+        # drop tracks missed for a few frames, as Sort does after max_age
+        keep = bank.time_since_update <= 3
+        bank.keep(keep)
+        reference = [tracker for tracker, kept in zip(reference, keep) if kept]
+        new = crowd(rng, rng.integers(0, 3) if frame else 10, size=600.0)
+        bank.add(new)
+        reference.extend(ReferenceTracker(box) for box in new)
+
+        for i, tracker in enumerate(reference):
+            np.testing.assert_allclose(bank.x[i], tracker.kf.x[:, 0], rtol=1e-9, atol=1e-6)
+            np.testing.assert_allclose(bank.P[i], tracker.kf.P, rtol=1e-9, atol=1e-6)
+
+
+def test_track_ids_are_numbered_per_tracker_and_survive_a_checkpoint():
+    first, second = sort.Sort(min_hits=1), sort.Sort(min_hits=1)
+    box = np.array([[10, 10, 50, 90, 0.9]])
+    assert first.update(box)[0, 4] == second.update(box)[0, 4] == 1
+
+    state = first.state()
+    restored = sort.Sort(min_hits=1)
+    restored.load_state(state)
+    restored.update(np.empty((0, 5)))
+    restored.update(np.empty((0, 5)))  # track 1 ages out
+    restored.update(box)
+    assert list(restored.active_ids()) == [2]
@@ -0,0 +1,66 @@
+import threading
+from datetime import datetime
+
+
+def stream_room(stream_id):
+    # Socket.IO room of a stream; stream_id is 1-based like RSTP_LINK_<n>
+    return f'stream_{stream_id}'
+
+
+class CountUpdatePublisher(object):
+    """
+    Coalesces count changes into at most one `update_count` message per stream
+    per interval, sent only to the clients subscribed to that stream's room. Each
+    message carries the latest daily totals and the delta, i.e. how many counted
+    crossings it folds together, so a busy entrance costs one emit per interval
+    instead of one emit to every client per person.
+    """
+    def __init__(self, socketio, streams, interval=0.25):
+        self.socketio = socketio
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.latest = [None for _ in range(streams)]  # last known counts of every stream
+        self.deltas = [0 for _ in range(streams)]
+        self.dirty = set()
+
+    def update(self, url_index, total, in_count, out_count, delta=0):
+        with self.lock:
+            self.latest[url_index] = {
+                'stream_id': url_index + 1,
+                'totalCount': total,
+                'inCount': in_count,
+                'outCount': out_count,
+            }
+            self.deltas[url_index] += delta
+            self.dirty.add(url_index)
+
+    def snapshot(self, url_index):
+        # Current counts of a stream with no delta, for a client that just subscribed
+        with self.lock:
+            latest = self.latest[url_index]
+        if latest is None:
+            return None
+        return dict(latest, delta=0, timestamp=datetime.now().strftime("%H:%M"))
+
+    def flush(self):
+        with self.lock:
+            pending = [(i, self.latest[i], self.deltas[i]) for i in sorted(self.dirty)]
+            for i, _, _ in pending:
+                self.deltas[i] = 0
+            self.dirty.clear()
+
+        timestamp = datetime.now().strftime("%H:%M")
+        for i, latest, delta in pending:
+            self.socketio.emit('update_count', dict(latest, delta=delta, timestamp=timestamp),
+                               to=stream_room(i + 1))
+
+    def run(self):
+        while True:
+            self.socketio.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error while publishing count updates: {e}")
+
+    def start(self):
+        return self.socketio.start_background_task(self.run)